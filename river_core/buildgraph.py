@@ -0,0 +1,312 @@
+# See LICENSE for details
+"""Provide an incremental, dependency-aware build graph for plugin stages"""
+import os
+import json
+import time
+import hashlib
+import concurrent.futures
+from river_core.log import logger
+from river_core.dumpreader import content_hash
+from river_core.utils import shellCommand, jobRunner
+
+#: Stage ran and succeeded
+PASSED = 'passed'
+#: Stage ran and failed, or did not produce all its outputs
+FAILED = 'failed'
+#: Stage was skipped as its signature and outputs are unchanged
+UP_TO_DATE = 'up-to-date'
+#: Stage was not run as a stage it depends on failed
+BLOCKED = 'blocked'
+
+
+class Stage():
+    """
+    A node of a :py:class:`BuildGraph`: one command, e.g. compiling or
+    simulating one test, along with the files it reads and writes.
+    """
+
+    def __init__(self,
+                 name,
+                 command,
+                 inputs=(),
+                 outputs=(),
+                 deps=(),
+                 cwd=None,
+                 timeout=1800,
+                 test=None):
+        """Constructor.
+
+        :param name: Unique name of the stage, e.g. ``<test>:compile``. The
+            part after the last colon is the stage the command is tagged with
+            in the profile of the run.
+
+        :param command: The shell command to run.
+
+        :param inputs: Files read by the command. The stages producing them
+            are dependencies of this stage.
+
+        :param outputs: Files written by the command.
+
+        :param deps: Names of further stages this one depends on.
+
+        :param cwd: Directory to run the command in. Relative inputs and
+            outputs are resolved against it.
+
+        :param timeout: Seconds after which the command is killed.
+
+        :param test: Test the stage is tagged with in the profile of the run.
+
+        :type name: str
+
+        :type command: str
+
+        :type inputs: list
+
+        :type outputs: list
+
+        :type deps: list
+
+        :type cwd: str
+
+        :type timeout: int
+
+        :type test: str
+        """
+        self.name = name
+        self.command = str(command)
+        self.cwd = os.path.abspath(cwd) if cwd is not None else os.getcwd()
+        self.inputs = [self._path(x) for x in inputs]
+        self.outputs = [self._path(x) for x in outputs]
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.test = test
+
+    def _path(self, path):
+        return os.path.normpath(os.path.join(self.cwd, str(path)))
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} name={self.name}>'
+
+    def signature(self):
+        """
+        Hash of everything the outputs of the stage depend on: the command,
+        its directory and the contents of its inputs.
+
+        :raise FileNotFoundError: If an input does not exist.
+
+        :rtype: str
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(json.dumps([self.command, self.cwd]).encode())
+        for path in self.inputs:
+            hasher.update(path.encode())
+            hasher.update(content_hash(path).encode())
+        return hasher.hexdigest()
+
+
+class BuildGraph():
+    """
+    Graph of :py:class:`Stage` objects which runs only the stages whose inputs,
+    command or outputs changed since their last successful run, as recorded in
+    a state file. Independent stages, e.g. of different tests, run in parallel
+    on a :py:class:`river_core.utils.jobRunner`.
+
+    Typical usage in a plugin::
+
+        graph = BuildGraph(os.path.join(work_dir, '.buildgraph.json'))
+        for test, attr in test_list.items():
+            wd = attr['work_dir']
+            graph.add(Stage(f'{test}:compile', compile_cmd, inputs=[attr['asm_file']],
+                            outputs=['dut.elf'], cwd=wd, test=test))
+            graph.add(Stage(f'{test}:sim', sim_cmd, inputs=['dut.elf'],
+                            outputs=['dut.dump'], cwd=wd, test=test))
+        results = graph.run(max_jobs=8)
+    """
+
+    def __init__(self, state_file):
+        """Constructor.
+
+        :param state_file: JSON file recording the signatures and output
+            hashes of the stages which succeeded.
+
+        :type state_file: str
+        """
+        self.state_file = state_file
+        self.stages = {}
+        self._state = {}
+        if os.path.isfile(state_file):
+            try:
+                with open(state_file, 'r') as fd:
+                    self._state = json.load(fd)
+            except ValueError:
+                logger.warning(f'Ignoring unreadable build state {state_file}')
+
+    def add(self, stage):
+        """
+        Add a stage to the graph.
+
+        :param stage: The stage.
+
+        :type stage: Stage
+
+        :raise ValueError: If a stage of the same name exists.
+        """
+        if stage.name in self.stages:
+            raise ValueError(f'Duplicate stage {stage.name}')
+        self.stages[stage.name] = stage
+
+    def dependencies(self):
+        """
+        Stages each stage depends on, from its explicit deps and the stages
+        producing its inputs.
+
+        :raise ValueError: If a dependency is unknown or the graph has a cycle.
+
+        :rtype: dict
+        """
+        producers = {}
+        for stage in self.stages.values():
+            for path in stage.outputs:
+                producers[path] = stage.name
+        deps = {}
+        for stage in self.stages.values():
+            deps[stage.name] = set(stage.deps)
+            deps[stage.name].update(producers[path] for path in stage.inputs
+                                    if path in producers)
+            deps[stage.name].discard(stage.name)
+            unknown = deps[stage.name] - self.stages.keys()
+            if unknown:
+                raise ValueError(
+                    f'Stage {stage.name} depends on unknown stages {sorted(unknown)}'
+                )
+        # Kahn's algorithm, only to reject cycles up front
+        remaining = {name: len(d) for name, d in deps.items()}
+        users = {name: [] for name in deps}
+        for name, d in deps.items():
+            for dep in d:
+                users[dep].append(name)
+        ready = [name for name, count in remaining.items() if count == 0]
+        seen = 0
+        while ready:
+            name = ready.pop()
+            seen += 1
+            for user in users[name]:
+                remaining[user] -= 1
+                if remaining[user] == 0:
+                    ready.append(user)
+        if seen != len(deps):
+            raise ValueError('Build graph has a cycle')
+        return deps
+
+    def is_stale(self, stage):
+        """
+        Whether a stage needs to run.
+
+        :param stage: The stage.
+
+        :type stage: Stage
+
+        :rtype: bool
+        """
+        record = self._state.get(stage.name)
+        if record is None:
+            return True
+        try:
+            if record['signature'] != stage.signature():
+                return True
+            return any(record['outputs'].get(path) != content_hash(path)
+                       for path in stage.outputs)
+        except OSError:
+            return True
+
+    def run(self, max_jobs=None, save_interval=5):
+        """
+        Run the stale stages, each once all the stages it depends on are done.
+        The state file is updated as stages succeed, at most every
+        save_interval seconds, so an interrupted run keeps most of its progress.
+
+        :param max_jobs: Number of stages running at once. Defaults to the
+            number of CPUs.
+
+        :param save_interval: Seconds between writes of the state file.
+
+        :type max_jobs: int
+
+        :type save_interval: float
+
+        :return: (status, jobResult or None) of every stage, by name.
+
+        :rtype: dict
+        """
+        deps = self.dependencies()
+        users = {name: [] for name in deps}
+        for name, d in deps.items():
+            for dep in d:
+                users[dep].append(name)
+        waiting = {name: len(d) for name, d in deps.items()}
+        results = {}
+        running = {}
+        ready = [name for name, count in waiting.items() if count == 0]
+        last_save = time.monotonic()
+
+        def finish(name, status, job=None):
+            results[name] = (status, job)
+            for user in users[name]:
+                if status in (PASSED, UP_TO_DATE):
+                    waiting[user] -= 1
+                    if waiting[user] == 0:
+                        ready.append(user)
+                elif user not in results:
+                    logger.error(f'{user} : blocked by {name}')
+                    finish(user, BLOCKED)
+
+        with jobRunner(max_jobs) as runner:
+            while ready or running:
+                while ready:
+                    stage = self.stages[ready.pop()]
+                    if not self.is_stale(stage):
+                        logger.debug(f'{stage.name} : up to date')
+                        finish(stage.name, UP_TO_DATE)
+                        continue
+                    try:
+                        signature = stage.signature()
+                    except OSError as err:
+                        logger.error(f'{stage.name} : missing input {err.filename}')
+                        finish(stage.name, FAILED)
+                        continue
+                    self._state.pop(stage.name, None)
+                    future = runner.submit(shellCommand(stage.command), name=stage.name,
+                                           timeout=stage.timeout, cwd=stage.cwd,
+                                           test=stage.test,
+                                           stage=stage.name.rsplit(':', 1)[-1])
+                    running[future] = (stage, signature)
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stage, signature = running.pop(future)
+                    job = future.result()
+                    missing = [x for x in stage.outputs if not os.path.isfile(x)]
+                    if job.returncode != 0 or missing:
+                        logger.error(f'{stage.name} : failed' +
+                                     (f', missing outputs {missing}' if missing else ''))
+                        finish(stage.name, FAILED, job)
+                        continue
+                    self._state[stage.name] = {
+                        'signature': signature,
+                        'outputs': {x: content_hash(x) for x in stage.outputs}
+                    }
+                    finish(stage.name, PASSED, job)
+                if time.monotonic() - last_save > save_interval:
+                    self.save()
+                    last_save = time.monotonic()
+        self.save()
+        return results
+
+    def save(self):
+        """Write the state file atomically."""
+        tmp_file = f'{self.state_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as fd:
+            json.dump(self._state, fd)
+        os.replace(tmp_file, self.state_file)
@@ -1,10 +1,13 @@
 # See LICENSE for details
 
 import os
+import re
 from ruamel.yaml import YAML
 from cerberus import Validator
 
 root = os.path.abspath(os.path.dirname(__file__))
+
+dump_regex = re.compile(r'.*core\s*(?P<coreid>\d):\s*(?P<priv>\d)\s*(?P<pc>.*?)\s+\((?P<instr>.*?)\)(?P<change>.*?)$') #: Regex for a commit record of a dump
 testlist_schema = '''
 asm_file:
   type: string
@@ -129,6 +132,14 @@ count = 1
 
 '''
 
+mismatch_context = 5 #: Records logged on either side of the first mismatch with --first-mismatch
+mismatch_summary = 10 #: Mismatches of a test stored in the result lists and the report
+result_cache_size = 256 << 20 #: Bytes of comparison results kept in the cache of a work directory
+output_tail_size = 64 << 10 #: Bytes of each output stream kept in memory when a command's output is streamed to a log file
+yaml_cache_min_age = 2 #: Seconds since its last modification before a YAML file is cached by load_yaml, so that rewrites within the timestamp granularity are not missed
+kill_grace_period = 5 #: Seconds a timed out command has to exit after SIGTERM before its process group gets SIGKILL
+kill_poll_interval = 0.2 #: Longest interval, in seconds, between checks that a killed process group is gone, the first being after 10 ms
+
 header_temp = '''------------RiVer Core Verification Framework------------
 Version: {0}
 Copyright (c) 2021 InCore Semiconductors Pvt. Ltd.
@@ -0,0 +1,329 @@
+# See LICENSE for details
+"""Provide a memory-mapped reader for commit logs and signature dumps"""
+import os
+import mmap
+import hashlib
+
+#: Size of the blocks scanned while counting lines
+CHUNK_SIZE = 1 << 20
+
+#: Size of the blocks compared at a time by common_prefix, small enough for
+#: both blocks to stay in the CPU caches
+COMPARE_SIZE = 1 << 18
+
+_hashes = {}
+
+
+class DumpReader():
+    """
+    Read-only view of a dump file backed by :py:mod:`mmap`. Records are
+    handed out as :py:class:`bytes` slices one at a time, so the memory held by
+    a consumer does not grow with the size of the dump.
+
+    Can be used as a context manager::
+
+        with DumpReader('dut.dump') as dump:
+            for record in dump.records():
+                ...
+    """
+
+    def __init__(self, path):
+        """Constructor.
+
+        :param path: Path to the dump file.
+
+        :type path: str
+        """
+        self.path = path
+        self._fd = open(path, 'rb')
+        if os.fstat(self._fd.fileno()).st_size:
+            self._mm = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # mmap refuses zero length files
+            self._mm = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._mm)
+
+    def close(self):
+        """Unmap and close the underlying file."""
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._mm = b''
+        self._fd.close()
+
+    def records(self, offset=0):
+        """
+        Generator over the lines of the dump, without the trailing newline.
+
+        :param offset: Byte offset from which to start. It is expected to be the
+            start of a line.
+
+        :type offset: int
+
+        :return: One line of the dump at a time.
+
+        :rtype: bytes
+        """
+        mm = self._mm
+        end = len(mm)
+        while offset < end:
+            nl = mm.find(b'\n', offset)
+            if nl < 0:
+                nl = end
+            yield mm[offset:nl]
+            offset = nl + 1
+
+    def blocks(self, size=CHUNK_SIZE):
+        """
+        Generator over the dump in blocks of about size bytes, each ending
+        after a newline or at the end of the dump.
+
+        :param size: Minimum size of a block.
+
+        :type size: int
+
+        :return: (offset, block) pairs.
+
+        :rtype: tuple
+        """
+        mm = self._mm
+        end = len(mm)
+        start = 0
+        while start < end:
+            stop = mm.find(b'\n', min(start + size, end) - 1)
+            stop = end if stop < 0 else stop + 1
+            yield start, mm[start:stop]
+            start = stop
+
+    def common_prefix(self, other, offset=0, other_offset=0):
+        """
+        Length of the run of identical bytes at the given offsets of this dump
+        and another one. The dumps are compared a block at a time, and only a
+        block which differs is narrowed down to its first differing byte.
+
+        :param other: The dump to compare against.
+
+        :param offset: Byte offset in this dump.
+
+        :param other_offset: Byte offset in the other dump.
+
+        :type other: DumpReader
+
+        :type offset: int
+
+        :type other_offset: int
+
+        :rtype: int
+        """
+        mm1 = self._mm
+        mm2 = other._mm
+        length = min(len(mm1) - offset, len(mm2) - other_offset)
+        start = 0
+        while start < length:
+            size = min(COMPARE_SIZE, length - start)
+            if mm1[offset + start:offset + start + size] != \
+                    mm2[other_offset + start:other_offset + start + size]:
+                break
+            start += size
+        else:
+            return max(length, 0)
+        # bisect the differing block, its first half is checked first
+        while size > 1:
+            half = size // 2
+            if mm1[offset + start:offset + start + half] == \
+                    mm2[other_offset + start:other_offset + start + half]:
+                start += half
+                size -= half
+            else:
+                size = half
+        return start
+
+    def line_start(self, offset, lines=0):
+        """
+        Start of the line holding a byte offset, moved back over lines
+        non-empty lines before it.
+
+        :param offset: Byte offset in the dump.
+
+        :param lines: Number of non-empty lines to move back over.
+
+        :type offset: int
+
+        :type lines: int
+
+        :rtype: int
+        """
+        mm = self._mm
+        start = mm.rfind(b'\n', 0, offset) + 1
+        while lines and start:
+            previous = mm.rfind(b'\n', 0, start - 1) + 1
+            if mm[previous:start].strip():
+                lines -= 1
+            start = previous
+        return start
+
+    def find(self, needle, offset=0, end=None):
+        """
+        Find the start of the first line, at or after offset, which contains
+        needle.
+
+        :param needle: The byte string to look for.
+
+        :param offset: Byte offset from which to start searching.
+
+        :param end: Byte offset before which needle must end, the end of the
+            dump by default.
+
+        :type needle: bytes
+
+        :type offset: int
+
+        :type end: int
+
+        :return: Offset of the start of the matching line or -1 if not found.
+
+        :rtype: int
+        """
+        pos = self._mm.find(needle, offset, len(self._mm) if end is None else end)
+        if pos < 0:
+            return -1
+        return self._mm.rfind(b'\n', 0, pos) + 1
+
+    def count_lines(self, offset=0):
+        """
+        Number of lines in the dump from offset onwards. This matches
+        ``len(fd.readlines())``, i.e. an unterminated last line is counted.
+
+        :param offset: Byte offset from which to start counting.
+
+        :type offset: int
+
+        :rtype: int
+        """
+        mm = self._mm
+        end = len(mm)
+        count = 0
+        for start in range(offset, end, CHUNK_SIZE):
+            count += mm[start:start + CHUNK_SIZE].count(b'\n')
+        if end > offset and mm[end - 1:end] != b'\n':
+            count += 1
+        return count
+
+    def digest(self):
+        """
+        Content hash of the complete dump.
+
+        :return: Hex digest (blake2b, 128 bits).
+
+        :rtype: str
+        """
+        mm = self._mm
+        hasher = hashlib.blake2b(digest_size=16)
+        for start in range(0, len(mm), CHUNK_SIZE):
+            hasher.update(mm[start:start + CHUNK_SIZE])
+        return hasher.hexdigest()
+
+    def last_line(self):
+        """
+        Last non-empty line of the dump, without the trailing newline.
+
+        :rtype: bytes
+        """
+        mm = self._mm
+        end = len(mm)
+        while end and mm[end - 1:end] in (b'\n', b'\r'):
+            end -= 1
+        return mm[mm.rfind(b'\n', 0, end) + 1:end]
+
+
+def count_lines(path):
+    """
+    Convenience wrapper returning the number of lines in a dump.
+
+    :param path: Path to the dump file.
+
+    :type path: str
+
+    :rtype: int
+    """
+    with DumpReader(path) as dump:
+        return dump.count_lines()
+
+
+def last_line(path):
+    """
+    Convenience wrapper returning the last line of a dump as a string.
+
+    :param path: Path to the dump file.
+
+    :type path: str
+
+    :rtype: str
+    """
+    with DumpReader(path) as dump:
+        return dump.last_line().decode(errors='replace')
+
+
+def _hash_key(path):
+    stat = os.stat(path)
+    return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def known_content_hash(path):
+    """
+    Content hash of a dump if this process already knows it, see
+    :py:func:`content_hash`.
+
+    :param path: Path to the dump file.
+
+    :type path: str
+
+    :return: The hash or None.
+
+    :rtype: str
+    """
+    return _hashes.get(_hash_key(path))
+
+
+def remember_content_hash(path, digest):
+    """
+    Record the content hash of a dump computed while reading it otherwise, so
+    that :py:func:`content_hash` does not read it again.
+
+    :param path: Path to the dump file.
+
+    :param digest: Hex digest of the dump, as returned by
+        :py:meth:`DumpReader.digest`.
+
+    :type path: str
+
+    :type digest: str
+    """
+    _hashes[_hash_key(path)] = digest
+
+
+def content_hash(path):
+    """
+    Convenience wrapper returning the content hash of a dump. Hashes are
+    remembered for the lifetime of the process, keyed on the path, size and
+    modification time of the file, so repeated lookups of an unchanged dump do
+    not read it again.
+
+    :param path: Path to the dump file.
+
+    :type path: str
+
+    :rtype: str
+    """
+    key = _hash_key(path)
+    if key not in _hashes:
+        with DumpReader(path) as dump:
+            _hashes[key] = dump.digest()
+    return _hashes[key]
@@ -1,4 +1,5 @@
 import river_core.utils as utils
+import river_core.dumpreader as dumpreader
 import pytest
 import os
 import lief
@@ -23,20 +24,16 @@ def test_enquire(testname):
             # check if dut.dump is complete
             binary = lief.parse(elffile)
             tohost_addr = str.format('0x{:08X}', int(hex(binary.get_symbol('tohost').value), 16))
-            with open(dumpfile) as rtlfptr:
-                dump_lines = rtlfptr.readlines()
-                last_line = dump_lines[-1]
+            last_line = dumpreader.last_line(dumpfile)
+            if tohost_addr.lower() not in last_line:
+                assert False, testname + ' tohost is not written to yet'
+            else:
+                # check if spike simulation is over
+                spikedumpfile = node['work_dir'] + '/ref.dump'
+                # check if tohost is written to in spike dump
+                last_line = dumpreader.last_line(spikedumpfile)
                 if tohost_addr.lower() not in last_line:
-                    assert False, testname + ' tohost is not written to yet'
-                else:
-                    # check if spike simulation is over
-                    spikedumpfile = node['work_dir'] + '/ref.dump'
-                    # check if tohost is written to in spike dump
-                    with open(spikedumpfile) as spikefptr:
-                        spike_dump_lines = spikefptr.readlines()
-                        last_line = spike_dump_lines[-1]
-                        if tohost_addr.lower() not in last_line:
-                            assert False, testname + ' spike simulation has some errors'
+                    assert False, testname + ' spike simulation has some errors'
         else:
             dumpfile = node['work_dir'] + '/rtl_'+ hart_id +'.dump'
             if not os.path.exists(dumpfile):
@@ -45,8 +42,6 @@ def test_enquire(testname):
             else:
                 binary = lief.parse(elffile)
                 tohost_addr = str.format('0x{:08X}', int(hex(binary.get_symbol('tohost').value), 16))
-                with open(dumpfile) as rtlfptr:
-                    dump_lines = rtlfptr.readlines()
-                    last_line = dump_lines[-1]
-                    if tohost_addr not in last_line:
-                        assert False, testname + ' tohost is not written to yet'
\ No newline at end of file
+                last_line = dumpreader.last_line(dumpfile)
+                if tohost_addr not in last_line:
+                    assert False, testname + ' tohost is not written to yet'
\ No newline at end of file
@@ -2,6 +2,7 @@
 """Console script for river_core."""
 import click
 import os
+import signal
 from river_core.log import *
 from river_core.rivercore import rivercore_clean, rivercore_compile, rivercore_generate, rivercore_merge, rivercore_setup, rivercore_comparison
 from river_core.__init__ import __version__
@@ -25,10 +26,19 @@ def check_config():
         raise SystemExit(1)
 
 
+def exit_on_sigterm(signum, frame):
+    """ Raise SystemExit on SIGTERM, e.g. from a cancelled CI job, so that the
+    commands started in their own sessions, which the signal does not reach,
+    are killed on the way out.
+    """
+    raise SystemExit(128 + signum)
+
+
 @click.group()
 @click.version_option(version=__version__)
 def cli():
     """RiVer Core Verification Framework"""
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
 
 
 @click.version_option(version=__version__)
@@ -156,9 +166,25 @@ def setup(config, dut, gen, ref, verbosity):
     default = '-1',
     help = 'Start pc value in Hex for log comparisons'
 )
+@click.option(
+    '--max-mismatches',
+    default = 10,
+    help = 'Stop comparing the logs of a test after these many mismatches, 0 compares the complete logs'
+)
+@click.option(
+    '--first-mismatch',
+    is_flag = True,
+    help = 'Stop comparing the logs of a test at the first mismatch and report the records around it'
+)
+@click.option(
+    '--profile',
+    is_flag = True,
+    help = 'Record the wall time, CPU time and peak memory of the commands run by the plugins'
+)
 @cli.command()
 def compile(config, test_list, coverage, verbosity, dut_stage, ref_stage,
-            compare, nproc, timeout, comparestartpc):
+            compare, nproc, timeout, comparestartpc, max_mismatches, first_mismatch,
+            profile):
     '''
         subcommand to compile generated programs.
     '''
@@ -188,7 +214,8 @@ def compile(config, test_list, coverage, verbosity, dut_stage, ref_stage,
                     'Compare is enabled\nThis will be generating incomplete reports'
                 )
     rivercore_compile(config, test_list, coverage, verbosity, dut_stage,
-                      ref_stage, compare, nproc, timeout,comparestartpc)
+                      ref_stage, compare, nproc, timeout,comparestartpc,
+                      max_mismatches, first_mismatch, profile)
 @click.option('-t',
               '--test_list',
               type=click.Path(dir_okay=False, exists=True),
@@ -213,13 +240,30 @@ def compile(config, test_list, coverage, verbosity, dut_stage, ref_stage,
     default = '-1',
     help = 'Start pc value in Hex for log comparisons'
 )
+@click.option(
+    '--max-mismatches',
+    default = 10,
+    help = 'Stop comparing the logs of a test after these many mismatches, 0 compares the complete logs'
+)
+@click.option(
+    '--first-mismatch',
+    is_flag = True,
+    help = 'Stop comparing the logs of a test at the first mismatch and report the records around it'
+)
+@click.option(
+    '--resume',
+    is_flag = True,
+    help = 'Reuse the results journaled by a previous run for tests whose dumps have not changed'
+)
 @cli.command()
-def comparison(test_list, output_dir, nproc, timeout, comparestartpc):
+def comparison(test_list, output_dir, nproc, timeout, comparestartpc,
+               max_mismatches, first_mismatch, resume):
     '''
         subcommand to compare compiled test logs.
     '''
     logger.info(constants.header_temp.format(__version__))  
-    rivercore_comparison(test_list, output_dir, nproc, timeout,comparestartpc)
+    rivercore_comparison(test_list, output_dir, nproc, timeout,comparestartpc,
+                         max_mismatches, first_mismatch, resume)
     
 @click.option('-t',
               '--test_list',
@@ -260,15 +304,20 @@ def enquire(test_list,hart_id):
     help=
     'Override the test generators given by the config file'
 )
+@click.option(
+    '--skip-unchanged',
+    is_flag = True,
+    help = 'Skip validating the tests unchanged since the last generated test list'
+)
 @cli.command()
-def generate(config, verbosity, filter_testgen):
+def generate(config, verbosity, filter_testgen, skip_unchanged):
     """
     subcommand to generate programs.
     """
     logger.info(constants.header_temp.format(__version__))
     if not config:
         config = check_config()
-    rivercore_generate(config, verbosity, filter_testgen)
+    rivercore_generate(config, verbosity, filter_testgen, skip_unchanged)
 
 
 @click.version_option(version=__version__)
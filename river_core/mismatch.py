@@ -0,0 +1,212 @@
+# See LICENSE for details
+"""Provide structured records for mismatches found in log comparisons"""
+import os
+import json
+from river_core.constants import dump_regex
+
+#: Kind of a mismatch in coreid, privilege mode, pc or instruction
+BASE_MISMATCH = 'BM'
+#: Kind of a mismatch in the register/memory updates of a record
+STATE_MISMATCH = 'SM'
+#: Kind of a record present in only one of the two logs
+MISSING = 'missing'
+
+
+class Mismatch():
+    """
+    A single mismatch between the DuT and the reference logs of a test.
+
+    The ``dut`` and ``ref`` attributes hold the complete commit records,
+    including the register/memory updates, as found in each log. One of them is
+    None for mismatches of kind ``missing``. The first mismatch of a comparison
+    may also carry the records surrounding it in ``context``.
+    """
+
+    __slots__ = ('kind', 'pc', 'instr', 'dut', 'ref', 'context')
+
+    def __init__(self, kind, dut=None, ref=None, context=None):
+        """Constructor.
+
+        :param kind: One of ``BM``, ``SM`` or ``missing``.
+
+        :param dut: The record from the DuT log.
+
+        :param ref: The record from the reference log.
+
+        :param context: (before, after) lists of (dut, ref) record pairs. The
+            mismatching pair is the last entry of before.
+
+        :type kind: str
+
+        :type dut: str
+
+        :type ref: str
+
+        :type context: tuple
+        """
+        self.kind = kind
+        self.dut = dut.strip() if dut is not None else None
+        self.ref = ref.strip() if ref is not None else None
+        self.context = context
+        fields = dump_regex.findall(self.dut if self.dut is not None else self.ref)
+        self.pc = fields[0][2] if fields else None
+        self.instr = fields[0][3] if fields else None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} kind={self.kind} pc={self.pc}>'
+
+    def to_dict(self):
+        """
+        JSON friendly representation of the mismatch.
+
+        :rtype: dict
+        """
+        record = {
+            'kind': self.kind,
+            'pc': self.pc,
+            'instr': self.instr,
+            'dut': self.dut,
+            'ref': self.ref
+        }
+        if self.context:
+            record['context'] = {
+                'before': [list(x) for x in self.context[0]],
+                'after': [list(x) for x in self.context[1]]
+            }
+        return record
+
+    @classmethod
+    def from_dict(cls, record):
+        """
+        Recreate a mismatch from :py:meth:`to_dict`.
+
+        :param record: The dict representation.
+
+        :type record: dict
+
+        :rtype: Mismatch
+        """
+        context = record.get('context')
+        if context:
+            context = ([tuple(x) for x in context['before']],
+                       [tuple(x) for x in context['after']])
+        return cls(record['kind'], record['dut'], record['ref'], context)
+
+    def format(self, file1, file2):
+        """
+        Render the mismatch in the format of the comparison logs.
+
+        :param file1: The path to the DuT log.
+
+        :param file2: The path to the reference log.
+
+        :type file1: str
+
+        :type file2: str
+
+        :rtype: str
+        """
+        if self.pc is None:
+            return f'\nBM: Unable to parse {self.dut or self.ref}'
+        if self.kind == MISSING and self.ref is None:
+            return f'\nBM: {file1} at PC: {self.pc} and missing in {file2}'
+        if self.kind == MISSING:
+            return f'\nBM: Missing entry in {file1}'
+        if self.kind == STATE_MISMATCH:
+            return f'\nSM: at PC: {self.pc}\nBM: Strings Match at PC: {self.pc}'
+        ref_fields = dump_regex.findall(self.ref)
+        ref_pc = ref_fields[0][2] if ref_fields else self.ref
+        return f'\nBM: {file1} at PC: {self.pc} and {file2} at PC: {ref_pc}'
+
+
+def format_context(file1, file2, context):
+    """
+    Render the records surrounding the first mismatch of a comparison.
+
+    :param file1: The path to the DuT log.
+
+    :param file2: The path to the reference log.
+
+    :param context: (before, after) lists of (dut, ref) record pairs.
+
+    :type context: tuple
+
+    :rtype: str
+    """
+    before, after = context
+    name1 = os.path.basename(file1)
+    name2 = os.path.basename(file2)
+    pivot = len(before) - 1
+    rout = '\nContext around the first mismatch:'
+    for pos, (line1, line2) in enumerate(list(before) + list(after)):
+        rout += f'\n[{pos - pivot:+d}] {name1}: {line1.strip()}'
+        rout += f'\n[{pos - pivot:+d}] {name2}: {line2.strip()}'
+    return rout
+
+
+def format_mismatches(mismatches, file1, file2, limit=0):
+    """
+    Render a list of mismatches as a comparison log.
+
+    :param mismatches: The mismatches found.
+
+    :param file1: The path to the DuT log.
+
+    :param file2: The path to the reference log.
+
+    :param limit: Maximum number of mismatches to render, 0 for all of them.
+
+    :type mismatches: list
+
+    :type file1: str
+
+    :type file2: str
+
+    :type limit: int
+
+    :rtype: str
+    """
+    if not mismatches:
+        return ''
+    shown = mismatches[:limit] if limit else mismatches
+    rout = ['\nMismatch infos:']
+    rout.extend(mismatch.format(file1, file2) for mismatch in shown)
+    if len(shown) < len(mismatches):
+        rout.append(f'\n... {len(mismatches) - len(shown)} more mismatches')
+    if mismatches[0].context:
+        rout.append(format_context(file1, file2, mismatches[0].context))
+    return ''.join(rout)
+
+
+def write_mismatches(path, mismatches):
+    """
+    Write mismatches as JSON lines, one record per line.
+
+    :param path: Path of the output file.
+
+    :param mismatches: The mismatches to write.
+
+    :type path: str
+
+    :type mismatches: list
+    """
+    with open(path, 'w') as fd:
+        for mismatch in mismatches:
+            fd.write(json.dumps(mismatch.to_dict()) + '\n')
+
+
+def read_mismatches(path):
+    """
+    Generator over the mismatches in a file written by
+    :py:func:`write_mismatches`.
+
+    :param path: Path of the JSON lines file.
+
+    :type path: str
+
+    :rtype: Mismatch
+    """
+    with open(path, 'r') as fd:
+        for line in fd:
+            if line.strip():
+                yield Mismatch.from_dict(json.loads(line))
@@ -0,0 +1,180 @@
+# See LICENSE for details
+"""Provide resource accounting for the commands launched by river_core"""
+import os
+import json
+import time
+import subprocess
+
+#: Environment variable holding the path of the profile of the current run.
+#: Being in the environment, it is inherited by plugin worker processes.
+PROFILE_ENV = 'RIVER_CORE_PROFILE'
+#: Environment variable holding the stage used for untagged commands
+STAGE_ENV = 'RIVER_CORE_STAGE'
+
+
+class AccountedPopen(subprocess.Popen):
+    """
+    :py:class:`subprocess.Popen` which reaps its child with :py:func:`os.wait4`
+    and keeps the resource usage of the child in ``rusage``, along with the time
+    it was started at in ``start_time``. ``rusage`` stays None if the child was
+    reaped by other means, e.g. :py:meth:`poll`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.rusage = None
+        self.start_time = time.monotonic()
+        super().__init__(*args, **kwargs)
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # same fallback as subprocess when the child was reaped elsewhere
+            return (self.pid, 0)
+        if pid == self.pid:
+            self.rusage = rusage
+        return (pid, status)
+
+
+def enable(path):
+    """
+    Start recording the resource usage of commands into a profile. Any
+    existing profile at path is discarded.
+
+    :param path: Path of the JSON lines profile.
+
+    :type path: str
+    """
+    open(path, 'w').close()
+    os.environ[PROFILE_ENV] = os.path.abspath(path)
+
+
+def disable():
+    """Stop recording the resource usage of commands."""
+    os.environ.pop(PROFILE_ENV, None)
+    os.environ.pop(STAGE_ENV, None)
+
+
+def set_stage(stage):
+    """
+    Set the stage commands are tagged with when they do not specify one.
+
+    :param stage: Name of the stage, e.g. ``dut`` or ``ref``.
+
+    :type stage: str
+    """
+    os.environ[STAGE_ENV] = stage
+
+
+def record(process, command, test=None, stage=None, kill_latency=None):
+    """
+    Append the resource usage of a finished command to the profile of the run,
+    if profiling is enabled. The record is written with a single append so
+    that concurrent workers do not interleave their records.
+
+    :param process: The finished process.
+
+    :param command: The command which was run.
+
+    :param test: Name of the test the command belongs to.
+
+    :param stage: Stage of the command, e.g. ``compile`` or ``simulate``.
+        Defaults to the stage set with :py:func:`set_stage`.
+
+    :param kill_latency: Seconds taken to kill the command if it timed out.
+
+    :type process: AccountedPopen
+
+    :type command: str
+
+    :type test: str
+
+    :type stage: str
+
+    :type kill_latency: float
+    """
+    path = os.environ.get(PROFILE_ENV)
+    if not path:
+        return
+    rusage = getattr(process, 'rusage', None)
+    entry = {
+        'test': test,
+        'stage': stage if stage is not None else os.environ.get(STAGE_ENV),
+        'command': command,
+        'returncode': process.returncode,
+        'wall': round(time.monotonic() - process.start_time, 6),
+        'utime': round(rusage.ru_utime, 6) if rusage else None,
+        'stime': round(rusage.ru_stime, 6) if rusage else None,
+        'maxrss': rusage.ru_maxrss if rusage else None,
+        'kill_latency': round(kill_latency, 6) if kill_latency is not None else None
+    }
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(entry) + '\n').encode())
+    finally:
+        os.close(fd)
+
+
+def load(path):
+    """
+    Read the records of a profile.
+
+    :param path: Path of the JSON lines profile.
+
+    :type path: str
+
+    :rtype: list
+    """
+    records = []
+    with open(path, 'r') as fd:
+        for line in fd:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def summarise(records, top=20):
+    """
+    Aggregate the records of a profile per stage and per test.
+
+    :param records: Records from :py:func:`load`.
+
+    :param top: Number of tests to keep, the ones using the most CPU time.
+
+    :type records: list
+
+    :type top: int
+
+    :return: ``stages`` and ``tests`` lists of dicts with the number of
+        commands, total wall, user and system times in seconds and the peak RSS
+        in KiB, sorted by decreasing CPU time.
+
+    :rtype: dict
+    """
+    def aggregate(key):
+        totals = {}
+        for entry in records:
+            name = entry.get(key) or '-'
+            total = totals.setdefault(name, {
+                key: name,
+                'commands': 0,
+                'wall': 0.0,
+                'utime': 0.0,
+                'stime': 0.0,
+                'maxrss': 0
+            })
+            total['commands'] += 1
+            total['wall'] += entry['wall']
+            total['utime'] += entry['utime'] or 0.0
+            total['stime'] += entry['stime'] or 0.0
+            total['maxrss'] = max(total['maxrss'], entry['maxrss'] or 0)
+        for total in totals.values():
+            for field in ['wall', 'utime', 'stime']:
+                total[field] = round(total[field], 3)
+        return sorted(totals.values(),
+                      key=lambda x: x['utime'] + x['stime'],
+                      reverse=True)
+
+    return {'stages': aggregate('stage'), 'tests': aggregate('test')[:top]}
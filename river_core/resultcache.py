@@ -0,0 +1,136 @@
+# See LICENSE for details
+"""Provide a content-addressed cache of log comparison results"""
+import os
+import json
+import hashlib
+
+#: Version of the log comparators. Bump it whenever a change to the
+#: comparators alters their results, so that stale cache entries are not used.
+COMPARATOR_VERSION = 2
+
+
+class ResultCache():
+    """
+    Directory of small JSON records, one per comparison, named after the hash
+    of everything the result depends on: the contents of the two dumps and the
+    comparison settings. Identical comparisons, in this or any later run, are
+    looked up instead of being repeated.
+
+    Entries are written atomically, so workers of a pool may share a cache.
+    The modification time of an entry is refreshed on every hit, and
+    :py:meth:`evict` drops the least recently used entries once the cache
+    grows beyond its size limit.
+    """
+
+    def __init__(self, path, max_size):
+        """Constructor.
+
+        :param path: Directory holding the cache, created if missing.
+
+        :param max_size: Size in bytes beyond which entries are evicted.
+
+        :type path: str
+
+        :type max_size: int
+        """
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(*fields):
+        """
+        Key of a comparison.
+
+        :param fields: The dump hashes and comparison settings.
+
+        :return: Hex digest of the fields and :py:data:`COMPARATOR_VERSION`.
+
+        :rtype: str
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(json.dumps([COMPARATOR_VERSION] + list(fields)).encode())
+        return hasher.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key[:2], key + '.json')
+
+    def get(self, key):
+        """
+        Look up a comparison result.
+
+        :param key: Key from :py:meth:`key`.
+
+        :type key: str
+
+        :return: The stored record or None on a miss.
+
+        :rtype: dict
+        """
+        entry = self._entry(key)
+        try:
+            with open(entry, 'r') as fd:
+                record = json.load(fd)
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return record
+
+    def put(self, key, record):
+        """
+        Store a comparison result.
+
+        :param key: Key from :py:meth:`key`.
+
+        :param record: JSON serialisable result.
+
+        :type key: str
+
+        :type record: dict
+
+        :raise OSError: If the entry cannot be written, e.g. on a full or
+            read-only filesystem. No partial entry is left behind.
+        """
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp_entry = f'{entry}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_entry, 'w') as fd:
+                json.dump(record, fd)
+            os.replace(tmp_entry, entry)
+        except OSError:
+            if os.path.exists(tmp_entry):
+                os.remove(tmp_entry)
+            raise
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in its
+        size limit.
+
+        :return: Number of entries removed.
+
+        :rtype: int
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                entry = os.path.join(root, name)
+                try:
+                    stat = os.stat(entry)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry))
+                total += stat.st_size
+        removed = 0
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(entry)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
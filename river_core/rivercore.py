@@ -14,6 +14,13 @@ import json
 import pytest
 from river_core.log import *
 import river_core.utils as utils
+import river_core.profiling as profiling
+from river_core.mismatch import Mismatch, format_mismatches, write_mismatches
+import river_core.trace as trace
+from river_core.resultcache import ResultCache
+from river_core.validation import validate_test_list
+from river_core.testlist import TestList
+from river_core.dumpreader import content_hash
 from river_core.constants import *
 from river_core.__init__ import __version__
 from river_core.sim_hookspecs import *
@@ -27,7 +34,12 @@ yaml.default_flow_style = False
 yaml.allow_unicode = True
 yaml.compact(seq_seq=False, seq_map=False)
 from multiprocessing import Pool
+from concurrent.futures import ProcessPoolExecutor
 startpc = '-1'
+maxmismatches = 10
+mismatchcontext = 0
+resumed = {}
+resultcache_dir = None
 
 # Misc Helper Functions
 def sanitise_pytest_json(json):
@@ -117,7 +129,7 @@ def generate_coverage_report(output_dir, config, coverage_report,
 
 
 def generate_report(output_dir, gen_json_data, target_json_data, ref_json_data,
-                    config, test_dict):
+                    config, test_dict, profile=None):
     '''
         Function to create an HTML report from the JSON files generated by individual plugins
 
@@ -133,6 +145,8 @@ def generate_report(output_dir, gen_json_data, target_json_data, ref_json_data,
 
         :param test_dict: Test List YAML 
 
+        :param profile: Resource usage summary from :py:func:`river_core.profiling.summarise`
+
         :type output_dir: str
 
         :type gen_json_data: dict 
@@ -145,6 +159,8 @@ def generate_report(output_dir, gen_json_data, target_json_data, ref_json_data,
 
         :type test_list: dict 
 
+        :type profile: dict
+
         :return: Final HTML path
 
         :rtype: str 
@@ -198,6 +214,7 @@ def generate_report(output_dir, gen_json_data, target_json_data, ref_json_data,
     html_objects['num_failed'] = num_failed
     html_objects['num_unav'] = num_unav
     html_objects['total_instr'] = total_instr
+    html_objects['profile'] = profile
     generator_count = {}
     for i in test_dict:
         if test_dict[i]['generator'] not in generator_count:
@@ -282,7 +299,8 @@ def rivercore_clean(config_file, verbosity):
             logger.info(output_dir + ' directory deleted')
 
 
-def rivercore_generate(config_file, verbosity, filter_testgen):
+def rivercore_generate(config_file, verbosity, filter_testgen,
+                       skip_unchanged=False):
     '''
         Function to generate the assembly programs using the plugin as configured in the config.ini.
 
@@ -290,9 +308,13 @@ def rivercore_generate(config_file, verbosity, filter_testgen):
 
         :param verbosity: Verbosity level for the framework
 
+        :param skip_unchanged: Skip validating the tests unchanged since the last generated test list
+
         :type config_file: click.Path
 
         :type verbosity: str
+
+        :type skip_unchanged: bool
     '''
 
     logger.level(verbosity)
@@ -308,9 +330,6 @@ def rivercore_generate(config_file, verbosity, filter_testgen):
 
     logger.info('****** Generation Mode ****** ')
 
-    # TODO Test multiple plugin cases
-    # Current implementation is using for loop, which might be a bad idea for parallel processing.
-
     suite_list = config['river_core']['generator'].replace(' ', '').split(',')
 
     logger.info(
@@ -327,78 +346,52 @@ def rivercore_generate(config_file, verbosity, filter_testgen):
         filter_testgen_set = set(filter_testgen)
         if not filter_testgen_set.issubset(suite_list_set):
             logger.err("Test generator(s) passed does not exist in the config file")
-        suite_list = list(suite_list_set.intersection(filter_testgen_set))
+        suite_list = [x for x in suite_list if x in filter_testgen_set]
 
+    budget = config['river_core'].getint('generate_jobs',
+                                         fallback=os.cpu_count() or 1)
+    suite_jobs = share_jobs(
+        {suite: config[suite].getint('jobs') for suite in suite_list}, budget)
     for suite in suite_list:
-
-        # for suite not in filter_testgen
-        if filter_testgen:
-            if suite not in filter_testgen:
-                continue
-
         # Give Plugin Info
         logger.info("Plugin Jobs : {0}".format(config[suite]['jobs']))
+        if suite_jobs[suite] != config[suite].getint('jobs'):
+            logger.info(
+                "Plugin Jobs reduced to {0} for {1} to fit in generate_jobs = {2}"
+                .format(suite_jobs[suite], suite, budget))
         logger.info("Plugin Seed : {0}".format(config[suite]['seed']))
         logger.info("Plugin Count (Times to run the test) : {0}".format(
             config[suite]['count']))
-        generatorpm = pluggy.PluginManager("generator")
-        generatorpm.add_hookspecs(RandomGeneratorSpec)
-
-        path_to_module = os.path.abspath(config['river_core']['path_to_suite'])
-        plugin_suite = suite + '_plugin'
-
-        # Get ISA and pass to plugin
-        isa = config['river_core']['isa']
-        config[suite]['isa'] = isa
-        logger.info('Now loading {0} Suite'.format(suite))
-        abs_location_module = path_to_module + '/' + plugin_suite + '/' + plugin_suite + '.py'
-        logger.debug("Loading module from {0}".format(abs_location_module))
-        try:
-            generatorpm_spec = importlib.util.spec_from_file_location(
-                plugin_suite, abs_location_module)
-            generatorpm_module = importlib.util.module_from_spec(
-                generatorpm_spec)
-            generatorpm_spec.loader.exec_module(generatorpm_module)
-            plugin_class = "{0}_plugin".format(suite)
-            class_to_call = getattr(generatorpm_module, plugin_class)
-            # TODO:DOC: Naming for class in plugin
-            generatorpm.register(class_to_call())
-
-        except FileNotFoundError as txt:
-            logger.error(suite + " not found at : " + path_to_module + ".\n" +
-                         str(txt))
-            raise SystemExit(1)
-
-        generatorpm.hook.pre_gen(spec_config=config[suite],
-                                 output_dir='{0}/{1}'.format(output_dir, suite))
-        test_list.update(
-            generatorpm.hook.gen(module_dir=path_to_module,
-                                 output_dir=output_dir)[0])
-        if not isinstance(test_list, dict):
-            logger.error(
-                'Test List returned by the gen hook of Generator is of type: ' +
-                str(type(test_list)) + '. Expected Dict')
-            raise SystemExit(1)
 
-        generatorpm.hook.post_gen(
-            output_dir='{0}/{1}'.format(output_dir, suite))
+    # Each suite runs in its own process, concurrently with the others
+    with ProcessPoolExecutor(max_workers=max(1, len(suite_list))) as executor:
+        futures = [
+            executor.submit(generate_suite, config_file, suite,
+                            suite_jobs[suite]) for suite in suite_list
+        ]
+        for future in futures:
+            test_list.update(future.result())
 
     logger.info('Validating Generated Test-List')
-    testschema = yaml.load(testlist_schema)
-    validator = YamlValidator(testschema)
-    validator.allow_unknown = False
-    for test, fields in test_list.items():
-        valid = validator.validate(fields)
-        if not valid:
-            logger.error('Test List Validation failed:')
-            error_list = validator.errors
+    errors = validate_test_list(test_list, budget,
+                                output_dir + '/.test_list.validated.json',
+                                skip_unchanged)
+    if errors:
+        logger.error('Test List Validation failed:')
+        for test, error_list in errors.items():
             for x in error_list:
                 logger.error('{0} [ {1} ] : {2}'.format(test, x, error_list[x]))
-            raise SystemExit(1)
-        test_list[test] = validator.normalized(fields, testschema)
+        raise SystemExit(1)
     logger.info('Test List Validated successfully')
     logger.info(f'Total Tests : {len(test_list)}')
     
+    if config['river_core'].get('test_list_format', 'yaml') == 'sqlite':
+        test_list_db = output_dir + '/test_list.db'
+        logger.info('Storing generated Test-List at: ' + str(test_list_db))
+        if os.path.isfile(test_list_db):
+            os.remove(test_list_db)
+        with TestList(test_list_db) as store:
+            store.update(test_list)
     test_list_file = output_dir + '/test_list.yaml'
     logger.info('Dumping generated Test-List at: ' + str(test_list_file))
     testfile = open(test_list_file, 'w')
@@ -419,8 +412,114 @@ def rivercore_generate(config_file, verbosity, filter_testgen):
                 return 1
 
 
+def share_jobs(requested, budget):
+    """
+    Split a budget of CPUs across generator suites running at once. A suite
+    running alone, or suites which fit in the budget, keep the jobs they ask
+    for. Otherwise every suite is scaled down in proportion, keeping at least
+    one job, and the largest shares are trimmed until the total fits in the
+    budget. The total exceeds the budget only when there are more suites than
+    jobs in it, each suite then getting one job.
+
+    :param requested: Jobs asked for by each suite.
+
+    :param budget: Total number of jobs.
+
+    :type requested: dict
+
+    :type budget: int
+
+    :rtype: dict
+    """
+    total = sum(requested.values())
+    if len(requested) <= 1 or total <= budget:
+        return dict(requested)
+    shares = {
+        suite: max(1, jobs * budget // total)
+        for suite, jobs in requested.items()
+    }
+    # suites rounded up to one job may push the total over the budget
+    excess = sum(shares.values()) - budget
+    while excess > 0:
+        suite = max(shares, key=shares.get)
+        if shares[suite] == 1:
+            break
+        shares[suite] -= 1
+        excess -= 1
+    return shares
+
+
+def generate_suite(config_file, suite, jobs):
+    """
+    Run the pre_gen, gen and post_gen hooks of one generator suite. Meant to
+    run in a process of its own, so it reads the configuration on its own.
+
+    :param config_file: Config.ini file for generation
+
+    :param suite: Name of the generator suite.
+
+    :param jobs: Jobs the suite is allowed to use.
+
+    :type config_file: str
+
+    :type suite: str
+
+    :type jobs: int
+
+    :return: The test list returned by the suite.
+
+    :rtype: dict
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    output_dir = config['river_core']['work_dir']
+    generatorpm = pluggy.PluginManager("generator")
+    generatorpm.add_hookspecs(RandomGeneratorSpec)
+
+    path_to_module = os.path.abspath(config['river_core']['path_to_suite'])
+    plugin_suite = suite + '_plugin'
+
+    # Get ISA and pass to plugin
+    isa = config['river_core']['isa']
+    config[suite]['isa'] = isa
+    config[suite]['jobs'] = str(jobs)
+    logger.info('Now loading {0} Suite'.format(suite))
+    abs_location_module = path_to_module + '/' + plugin_suite + '/' + plugin_suite + '.py'
+    logger.debug("Loading module from {0}".format(abs_location_module))
+    try:
+        generatorpm_spec = importlib.util.spec_from_file_location(
+            plugin_suite, abs_location_module)
+        generatorpm_module = importlib.util.module_from_spec(
+            generatorpm_spec)
+        generatorpm_spec.loader.exec_module(generatorpm_module)
+        plugin_class = "{0}_plugin".format(suite)
+        class_to_call = getattr(generatorpm_module, plugin_class)
+        # TODO:DOC: Naming for class in plugin
+        generatorpm.register(class_to_call())
+
+    except FileNotFoundError as txt:
+        logger.error(suite + " not found at : " + path_to_module + ".\n" +
+                     str(txt))
+        raise SystemExit(1)
+
+    generatorpm.hook.pre_gen(spec_config=config[suite],
+                             output_dir='{0}/{1}'.format(output_dir, suite))
+    test_list = generatorpm.hook.gen(module_dir=path_to_module,
+                                     output_dir=output_dir)[0]
+    if not isinstance(test_list, dict):
+        logger.error(
+            'Test List returned by the gen hook of Generator is of type: ' +
+            str(type(test_list)) + '. Expected Dict')
+        raise SystemExit(1)
+
+    generatorpm.hook.post_gen(
+        output_dir='{0}/{1}'.format(output_dir, suite))
+    return test_list
+
+
 def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
-                      ref_flags, compare, process_count, timeout, comparestartpc):
+                      ref_flags, compare, process_count, timeout, comparestartpc,
+                      max_mismatches=10, first_mismatch=False, profile=False):
     '''
 
         Function to compile generated assembly programs using the plugin as configured in the config.ini.
@@ -439,6 +538,12 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
 
         :param compare: Verbosity level for the framework
 
+        :param max_mismatches: Number of mismatches after which the comparison of a test stops, 0 for no limit
+
+        :param first_mismatch: Stop comparing a test at the first mismatch and log the records around it
+
+        :param profile: Record the resources used by every command launched through river_core.utils
+
         :type config_file: click.Path
 
         :type test_list: click.Path
@@ -452,6 +557,12 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
         :type ref_flags: click.Choice 
 
         :type compare: bool 
+
+        :type max_mismatches: int
+
+        :type first_mismatch: bool
+
+        :type profile: bool
     '''
     
     logger.level(verbosity)
@@ -482,6 +593,10 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
     # Set default values:
     target_json = None
     ref_json = None
+    profile_file = output_dir + '/profile.jsonl'
+    if profile:
+        logger.info(f'Recording the resources used by commands in {profile_file}')
+        profiling.enable(profile_file)
     # Load coverage stats
     if coverage:
         logger.info("Coverage mode is enabled")
@@ -493,6 +608,7 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
     else:
         for target in target_list:
             if dut_flags:
+                profiling.set_stage(target)
                 logger.info("DuT Info")
                 logger.info("DuT Jobs : {0}".format(config[target]['jobs']))
                 logger.info("DuT Count (Times to run) : {0}".format(
@@ -567,6 +683,7 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
     else:
         for ref in ref_list:
             if ref_flags:
+                profiling.set_stage(ref)
                 logger.info("Reference Info")
                 logger.info("Reference Jobs : {0}".format(config[ref]['jobs']))
                 logger.info(
@@ -633,25 +750,28 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
             else:
                 logger.warning('Ref Plugin disabled')
 
+        ## Indexing dumps, opt-in as the traces only pay off when dumps are compared again
+        if utils.str_2_bool(config['river_core'].get('binary_traces', 'False')):
+            logger.info('Indexing dumps into binary traces')
+            with Pool(processes = process_count) as process_pool:
+                for _ in process_pool.imap_unordered(
+                        dumpconversion, schedule_by_size(utils.load_yaml(test_list))):
+                    pass
+
         ## Comparing Dumps
         if compare:
-            global startpc
+            global startpc, maxmismatches, mismatchcontext, resultcache_dir
             startpc = comparestartpc
+            resultcache_dir = output_dir + '/.cache'
+            maxmismatches = 1 if first_mismatch else max_mismatches
+            mismatchcontext = mismatch_context if first_mismatch else 0
             test_dict = utils.load_yaml(test_list)
             gen_json_data = []
             target_json_data = []
             ref_json_data = []
-            # parallelized
-            success = True
-            items = test_dict.items()
-            with Pool(processes = process_count) as process_pool:
-                output = process_pool.map(logcomparison, items) #Collecting the return values from each process in the Pool
-            #Updating values
-            for i in output:
-                success = success and i[0]
-                test_dict[i[1]]['result'] = i[2]
-                test_dict[i[1]]['log'] = i[3]
-                test_dict[i[1]]['num_instr'] = i[4]
+            # parallelized, largest tests first
+            items = schedule_by_size(test_dict)
+            success = run_comparisons(test_dict, items, process_count)
             utils.save_yaml(test_dict, output_dir+'/result_list.yaml')
             failed_dict = {}
             for test, attr in test_dict.items():
@@ -735,10 +855,17 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
             target_json_data = []
             ref_json_data = []
 
+        profile_summary = None
+        if profile:
+            profiling.disable()
+            profile_summary = profiling.summarise(profiling.load(profile_file))
+            utils.save_yaml(profile_summary, output_dir + '/profile.yaml')
+            logger.info(f'Resource usage summary saved in {output_dir}/profile.yaml')
+
         logger.info("Now generating some good HTML reports for you")
         report_html = generate_report(output_dir, gen_json_data,
                                       target_json_data, ref_json_data, config,
-                                      test_dict)
+                                      test_dict, profile_summary)
 
         # Check if web browser
         if utils.str_2_bool(config['river_core']['open_browser']):
@@ -751,7 +878,8 @@ def rivercore_compile(config_file, test_list, coverage, verbosity, dut_flags,
         if not success:
             raise SystemExit(1)
     
-def rivercore_comparison( test_list,output_dir, process_count, timeout, comparestartpc):
+def rivercore_comparison( test_list,output_dir, process_count, timeout, comparestartpc,
+                         max_mismatches=10, first_mismatch=False, resume=False):
     '''
 
         Function to compile generated assembly programs using the plugin as configured in the config.ini.
@@ -770,6 +898,12 @@ def rivercore_comparison( test_list,output_dir, process_count, timeout, compares
 
         :param compare: Verbosity level for the framework
 
+        :param max_mismatches: Number of mismatches after which the comparison of a test stops, 0 for no limit
+
+        :param first_mismatch: Stop comparing a test at the first mismatch and log the records around it
+
+        :param resume: Reuse the results journaled by a previous run for tests whose dumps are unchanged
+
         :type config_file: click.Path
 
         :type test_list: click.Path
@@ -783,6 +917,12 @@ def rivercore_comparison( test_list,output_dir, process_count, timeout, compares
         :type ref_flags: click.Choice 
 
         :type compare: bool 
+
+        :type max_mismatches: int
+
+        :type first_mismatch: bool
+
+        :type resume: bool
     '''
 
     logger.info('****** Compilation Mode ******')
@@ -800,23 +940,21 @@ def rivercore_comparison( test_list,output_dir, process_count, timeout, compares
         logger.level("info")
         ## Comparing Dumps
         if True:
-            global startpc
+            global startpc, maxmismatches, mismatchcontext, resumed, resultcache_dir
             startpc = comparestartpc
+            resultcache_dir = output_dir + '/.cache'
+            maxmismatches = 1 if first_mismatch else max_mismatches
+            mismatchcontext = mismatch_context if first_mismatch else 0
             test_dict = utils.load_yaml(test_list)
-            # parallelized
-            success = True
-            items = test_dict.items()
-            #start = time.time()
-            with Pool(processes = process_count) as process_pool:
-                output = process_pool.map(logcomparison, items) #Collecting the return values from each process in the Pool
-            #stop = time.time()
-            #logger.warn(stop - start)
-            #Updating values
-            for i in output:
-                success = success and i[0]
-                test_dict[i[1]]['result'] = i[2]
-                test_dict[i[1]]['log'] = i[3]
-                test_dict[i[1]]['num_instr'] = i[4]
+            journal = output_dir + '/result_journal.jsonl'
+            if resume:
+                resumed = load_journal(journal)
+                logger.info(f'Resuming from {len(resumed)} tests recorded in {journal}')
+            elif os.path.isfile(journal):
+                os.remove(journal)
+            # parallelized, largest tests first
+            items = schedule_by_size(test_dict)
+            success = run_comparisons(test_dict, items, process_count, journal=journal)
             utils.save_yaml(test_dict, output_dir+'/result_list.yaml')
             failed_dict = {}
             for test, attr in test_dict.items():
@@ -833,33 +971,230 @@ def rivercore_comparison( test_list,output_dir, process_count, timeout, compares
             raise SystemExit(1)
     
 
+def schedule_by_size(test_dict):
+    '''
+        Order the tests of a test list for the comparison pools, largest dumps
+        first, so that long comparisons start early and the short ones fill in
+        the gaps at the end of the run.
+
+        :param test_dict: The test list
+
+        :type test_dict: dict
+
+        :return: (test, attr) pairs sorted by decreasing size of the dumps
+
+        :rtype: list
+    '''
+    def dump_size(item):
+        size = 0
+        for dump in ['dut.dump', 'ref.dump', 'dut.signature']:
+            try:
+                size += os.path.getsize(item[1]['work_dir'] + '/' + dump)
+            except OSError:
+                pass
+        return size
+    return sorted(test_dict.items(), key=dump_size, reverse=True)
+
+
+def run_comparisons(test_dict, items, process_count, chunksize=1, journal=None):
+    '''
+        Compare the dumps of the given tests in a pool of workers. Tests are
+        handed out in small chunks and every result is stored in test_dict as
+        soon as it arrives. With a journal, each result is also appended to it
+        along with the fingerprint of the test, see :py:func:`journaledcomparison`.
+
+        :param test_dict: The test list to update with the results
+
+        :param items: (test, attr) pairs to compare, see :py:func:`schedule_by_size`
+
+        :param process_count: Number of worker processes
+
+        :param chunksize: Number of tests handed to a worker at a time
+
+        :param journal: Path of the JSON lines journal to append results to
+
+        :type test_dict: dict
+
+        :type items: list
+
+        :type process_count: int
+
+        :type chunksize: int
+
+        :type journal: str
+
+        :return: True if all the tests passed
+
+        :rtype: bool
+    '''
+    success = True
+    worker = logcomparison if journal is None else journaledcomparison
+    journal_fd = open(journal, 'a') if journal is not None else None
+    try:
+        with Pool(processes = process_count) as process_pool:
+            for i in process_pool.imap_unordered(worker, items, chunksize):
+                success = success and i[0]
+                test_dict[i[1]]['result'] = i[2]
+                test_dict[i[1]]['log'] = i[3]
+                test_dict[i[1]]['num_instr'] = i[4]
+                if i[5]:
+                    test_dict[i[1]]['mismatch_log'] = i[5]
+                if journal_fd is not None:
+                    journal_fd.write(json.dumps({
+                        'test': i[1],
+                        'success': i[0],
+                        'result': i[2],
+                        'log': i[3],
+                        'num_instr': i[4],
+                        'mismatch_log': i[5],
+                        'fingerprint': i[6]
+                    }) + '\n')
+                    journal_fd.flush()
+    finally:
+        if journal_fd is not None:
+            journal_fd.close()
+    if resultcache_dir is not None:
+        try:
+            evicted = ResultCache(resultcache_dir, result_cache_size).evict()
+        except OSError:
+            evicted = 0
+        if evicted:
+            logger.debug(f'Evicted {evicted} entries from the comparison cache')
+    return success
+
+
+def load_journal(journal):
+    '''
+        Read the results recorded in a journal by :py:func:`run_comparisons`.
+        A truncated last line, as left behind by an interrupted run, is ignored.
+
+        :param journal: Path of the JSON lines journal
+
+        :type journal: str
+
+        :return: The latest record of every test in the journal
+
+        :rtype: dict
+    '''
+    records = {}
+    if not os.path.isfile(journal):
+        return records
+    with open(journal, 'r') as journal_fd:
+        for line in journal_fd:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['test']] = record
+    return records
+
+
+def comparison_fingerprint(attr):
+    '''
+        Content hashes of the dumps compared for a test along with the
+        comparison settings. Equal fingerprints give equal results.
+
+        :param attr: The test list entry of the test
+
+        :type attr: dict
+
+        :rtype: dict
+    '''
+    fingerprint = {
+        'startpc': str(startpc),
+        'max_mismatches': maxmismatches,
+        'context': mismatchcontext
+    }
+    dumps = ['dut.signature', 'dut.dump'] if attr['self_checking'] else ['dut.dump', 'ref.dump']
+    for dump in dumps:
+        dump_file = attr['work_dir'] + '/' + dump
+        fingerprint[dump] = content_hash(dump_file) if os.path.isfile(dump_file) else None
+    return fingerprint
+
+
+#Helper function for parallel processing
+#Writes the binary trace sidecars of the DuT and reference dumps of a test
+def dumpconversion(item):
+    test, attr = item
+    if not attr['self_checking']:
+        for dump in ['dut.dump', 'ref.dump']:
+            dump_file = attr['work_dir'] + '/' + dump
+            if os.path.isfile(dump_file):
+                trace.load_trace(dump_file, convert=True)
+    return test
+
+
 #Helper function for parallel processing
-#Returns success,test,attr['result'],attr['log'],attr['numinstr']
+#Returns success,test,attr['result'],attr['log'],attr['numinstr'],attr['mismatch_log']
 def logcomparison(item):
     test, attr = item
     test_wd = attr['work_dir']
     is_self_checking = attr['self_checking']
+    mismatch_log = None
     if not is_self_checking:
         if not os.path.isfile(test_wd + '/dut.dump'):
             logger.error(f'{test:<30} : DUT dump is missing')
-            return False, test, 'Unavailable', "DUT dump is missing", None
+            return False, test, 'Unavailable', "DUT dump is missing", None, None
         if not os.path.isfile(test_wd + '/ref.dump'):
             logger.error(f'{test:<30} : REF dump is missing')
-            return False, test, 'Unavailable', 'REF dump is missing', None
+            return False, test, 'Unavailable', 'REF dump is missing', None, None
         compare_start_pc = str(startpc) if str(startpc)!='-1' else ''
-        result, log, insnsize = utils.compare_dumps(test_wd + '/dut.dump', test_wd + '/ref.dump',compare_start_pc)
+        cache = record = None
+        if resultcache_dir is not None:
+            try:
+                cache = ResultCache(resultcache_dir, result_cache_size)
+            except OSError as err:
+                logger.debug(f'{test:<30} : Comparison results are not cached: {err}')
+            else:
+                key = cache.key(content_hash(test_wd + '/dut.dump'), content_hash(test_wd + '/ref.dump'),
+                                compare_start_pc, maxmismatches, mismatchcontext)
+                record = cache.get(key)
+        if record is not None:
+            logger.debug(f'{test:<30} : Using the cached comparison result')
+            result, insnsize = record['result'], record['num_instr']
+            mismatches = [Mismatch.from_dict(x) for x in record['mismatches']]
+        else:
+            result, mismatches, insnsize = utils.compare_dumps_trace(test_wd + '/dut.dump', test_wd + '/ref.dump',compare_start_pc,
+                                                                     maxmismatches, mismatchcontext, structured=True)
+            if cache is not None:
+                try:
+                    cache.put(key, {'result': result, 'num_instr': insnsize,
+                                    'mismatches': [x.to_dict() for x in mismatches]})
+                except OSError as err:
+                    logger.debug(f'{test:<30} : Comparison result is not cached: {err}')
+        # only a bounded summary goes back to the parent, the records stay on disk
+        log = format_mismatches(mismatches, test_wd + '/dut.dump', test_wd + '/ref.dump', mismatch_summary)
+        if mismatches:
+            mismatch_log = test_wd + '/mismatches.jsonl'
+            write_mismatches(mismatch_log, mismatches)
+        elif os.path.isfile(test_wd + '/mismatches.jsonl'):
+            os.remove(test_wd + '/mismatches.jsonl')
     else:
         if not os.path.isfile(test_wd + '/dut.signature'):
             logger.error(f'{test:<30} : DUT signature is missing')
-            return False, test, 'Unavailable',"DUT signature is missing", None
-        result, log = utils.self_check(test_wd + '/dut.signature')
+            return False, test, 'Unavailable',"DUT signature is missing", None, None
+        result, log = utils.self_check(test_wd + '/dut.signature', maxmismatches == 1, mismatch_summary)
         insnsize = utils.get_file_size(test_wd + '/dut.dump')
     if result == 'Passed':
         logger.info(f"{test:<30} : TEST {result.upper()}")
-        return True, test, result, log, insnsize
+        return True, test, result, log, insnsize, mismatch_log
     else:
         logger.error(f"{test:<30} : TEST {result.upper()}")
-        return False, test, result, log, insnsize
+        return False, test, result, log, insnsize, mismatch_log
+
+
+#Helper function for parallel processing
+#Returns the result of logcomparison along with the fingerprint of the test.
+#Results journaled by the run being resumed are reused when the fingerprint matches.
+def journaledcomparison(item):
+    test, attr = item
+    fingerprint = comparison_fingerprint(attr)
+    record = resumed.get(test)
+    if record is not None and record['fingerprint'] == fingerprint:
+        logger.info(f"{test:<30} : TEST {record['result'].upper()} (resumed)")
+        return (record['success'], test, record['result'], record['log'],
+                record['num_instr'], record['mismatch_log'], fingerprint)
+    return logcomparison(item) + (fingerprint,)
 
 
 def rivercore_merge(verbosity, db_folders, output, config_file):
@@ -139,6 +139,8 @@ class DuTSpec(object):
         used to clean up unwanted artifacts like : elfs, hexfiles, objdumps, logs, etc which are no
         longer of consequence. One can further choose to only delete artifacts of passed tests and retain
         it for tests that failed (the pass/fail result is captured in the test-list itself). 
+        Dumps which are deleted should be deleted along with their binary traces, using
+        :py:func:`river_core.trace.remove_sidecar`.
 
         This stage can also further also be used to merge coverage databases of all the test runs, rank
         the tests and generate appropriate reports. This is completely optional and up to the user to
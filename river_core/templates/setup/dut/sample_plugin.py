@@ -10,6 +10,7 @@ import glob
 
 from river_core.log import logger
 from river_core.utils import *
+from river_core.trace import remove_sidecar
 
 dut_hookimpl = pluggy.HookimplMarker('dut')
 
@@ -109,7 +110,7 @@ class sample_plugin(object):
         logger.info('Build Hook')
         # TODO: Uses the Makefile approach, edit here if you want.
         make = makeUtil(makefilePath=os.path.join(self.work_dir,"Makefile." +\
-            self.name))
+            self.name), buffered=True)
         make.makeCommand = 'make -j1'
         self.make_file = os.path.join(self.work_dir, 'Makefile.' + self.name)
         self.test_names = []
@@ -147,6 +148,7 @@ class sample_plugin(object):
                     self.sim_args +' && '+ post_process_cmd
             make.add_target(target_cmd, test)
             self.test_names.append(test)
+        make.write()
 
     @dut_hookimpl
     def run(self, module_dir):
@@ -197,6 +199,7 @@ class sample_plugin(object):
                         os.remove(work_dir + '/code.mem')
                         os.remove(work_dir + '/dut.disass')
                         os.remove(work_dir + '/dut.dump')
+                        remove_sidecar(work_dir + '/dut.dump')
                         os.remove(work_dir + '/signature')
                     except:
                         logger.info(
@@ -57,7 +57,7 @@ def test_input(request):
     logger.debug('Generating commands from test_input fixture')
     program = request.param
     stage = program.split()[-1]
-    (ret, out, err) = sys_command(program)
+    (ret, out, err) = sys_command(program, test=stage)
     return ret, err, stage
 
 
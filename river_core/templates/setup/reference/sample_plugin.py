@@ -10,6 +10,7 @@ import pytest
 
 from river_core.log import logger
 from river_core.utils import *
+from river_core.trace import remove_sidecar
 
 dut_hookimpl = pluggy.HookimplMarker('dut')
 
@@ -66,7 +67,7 @@ class sample_plugin(object):
         logger.debug('Build Hook')
         # TODO: Uses the Makefile approach, edit here if you want.
         make = makeUtil(makefilePath=os.path.join(self.work_dir,"Makefile." +\
-            self.name))
+            self.name), buffered=True)
         make.makeCommand = 'make -j1'
         self.make_file = os.path.join(self.work_dir, 'Makefile.' + self.name)
         self.test_names = []
@@ -109,6 +110,7 @@ class sample_plugin(object):
                     self.sim_args.format(spike_isa, self.elf)
             make.add_target(target_cmd, test)
             self.test_names.append(test)
+        make.write()
 
     @dut_hookimpl
     def run(self, module_dir):
@@ -146,6 +148,7 @@ class sample_plugin(object):
                     try:
                         os.remove(work_dir + '/ref.disass')
                         os.remove(work_dir + '/ref.dump')
+                        remove_sidecar(work_dir + '/ref.dump')
                     except:
                         logger.info(
                             "Something went wrong trying to remove the files")
@@ -0,0 +1,149 @@
+# See LICENSE for details
+"""Provide a streaming test list store for large regressions"""
+import os
+import json
+import sqlite3
+import collections.abc
+from ruamel.yaml import YAML
+
+#: First bytes of every SQLite database file
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+def is_test_list_db(path):
+    """
+    Whether a file is a test list store rather than a YAML test list.
+
+    :param path: Path of the test list.
+
+    :type path: str
+
+    :rtype: bool
+    """
+    try:
+        with open(path, 'rb') as fd:
+            return fd.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+class TestList(collections.abc.MutableMapping):
+    """
+    Test list kept in an SQLite database, one row per test, which behaves as
+    the dict returned by :py:func:`river_core.utils.load_yaml` without loading
+    the whole list: tests are looked up by name, iterated over in the order
+    they were added, and added or updated in place.
+
+    :py:func:`river_core.utils.load_yaml` reads such a database as a plain
+    dict, so plugins may be given either form of the test list.
+    """
+
+    def __init__(self, path):
+        """Constructor.
+
+        :param path: Path of the database, created if missing.
+
+        :type path: str
+        """
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute('CREATE TABLE IF NOT EXISTS tests ('
+                         'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'name TEXT UNIQUE NOT NULL, '
+                         'attr TEXT NOT NULL)')
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+    def __getitem__(self, name):
+        row = self._db.execute('SELECT attr FROM tests WHERE name = ?',
+                               (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return json.loads(row[0])
+
+    def __setitem__(self, name, attr):
+        self.update({name: attr})
+
+    def __delitem__(self, name):
+        with self._db:
+            if not self._db.execute('DELETE FROM tests WHERE name = ?',
+                                    (name,)).rowcount:
+                raise KeyError(name)
+
+    def __iter__(self):
+        for row in self._db.execute('SELECT name FROM tests ORDER BY seq'):
+            yield row[0]
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM tests').fetchone()[0]
+
+    def __contains__(self, name):
+        return self._db.execute('SELECT 1 FROM tests WHERE name = ?',
+                                (name,)).fetchone() is not None
+
+    def items(self):
+        """
+        Generator over the (name, attr) pairs of the tests, read from the
+        database as they are consumed.
+
+        :rtype: tuple
+        """
+        for name, attr in self._db.execute(
+                'SELECT name, attr FROM tests ORDER BY seq'):
+            yield name, json.loads(attr)
+
+    def update(self, tests=(), **kwargs):
+        """
+        Add or replace tests in a single transaction. Replaced tests keep
+        their position.
+
+        :param tests: Mapping or (name, attr) pairs of the tests.
+
+        :type tests: dict
+        """
+        if isinstance(tests, collections.abc.Mapping):
+            tests = tests.items()
+        with self._db:
+            for name, attr in list(tests) + list(kwargs.items()):
+                attr = json.dumps(attr)
+                # no ON CONFLICT upsert, it needs SQLite 3.24
+                if not self._db.execute(
+                        'UPDATE tests SET attr = ? WHERE name = ?',
+                        (attr, name)).rowcount:
+                    self._db.execute(
+                        'INSERT INTO tests (name, attr) VALUES (?, ?)',
+                        (name, attr))
+
+    def to_dict(self):
+        """
+        The whole test list, as :py:func:`river_core.utils.load_yaml` returns
+        it for a YAML test list.
+
+        :rtype: dict
+        """
+        return dict(self.items())
+
+    def export_yaml(self, path):
+        """
+        Write the test list as YAML.
+
+        :param path: Path of the YAML file.
+
+        :type path: str
+        """
+        yaml = YAML(typ="safe")
+        yaml.default_flow_style = False
+        yaml.allow_unicode = True
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as fd:
+            yaml.dump(self.to_dict(), fd)
+        os.replace(tmp_file, path)
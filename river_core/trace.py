@@ -0,0 +1,401 @@
+# See LICENSE for details
+"""Provide a binary index of the records of commit logs"""
+import os
+import hashlib
+import numpy as np
+from river_core.dumpreader import DumpReader, content_hash, known_content_hash, remember_content_hash
+
+#: Suffix of the binary sidecar written next to a text dump
+SIDECAR_SUFFIX = '.rvtrace'
+
+#: Version of the sidecar layout. Sidecars of another version are ignored.
+TRACE_VERSION = 3
+
+#: Bytes dropped before records are compared, as by :py:meth:`bytes.split`
+_whitespace = np.zeros(256, dtype=bool)
+_whitespace[np.frombuffer(b' \t\n\r\x0b\x0c', dtype=np.uint8)] = True
+
+#: ASCII lowercase mapping, as done by :py:meth:`bytes.lower`, offset by one so
+#: that no byte hashes to zero
+_lower = np.arange(1, 257, dtype=np.uint64)
+_lower[ord('A'):ord('Z') + 1] += ord('a') - ord('A')
+
+#: Bytes offset by one, for hashes which keep the case
+_raw = np.arange(1, 257, dtype=np.uint64)
+
+#: Odd multipliers of the polynomial hashes of the records and of their pc
+_multiplier = np.uint64(0x9e3779b97f4a7c15)
+_pc_multiplier = np.uint64(0xc2b2ae3d27d4eb4f)
+
+#: Powers of the multipliers and of their inverses, by base
+_power_tables = {}
+
+
+def _inverse(multiplier):
+    """Inverse of an odd multiplier modulo 2**64, by Newton's iteration."""
+    multiplier = int(multiplier)
+    inverse = multiplier
+    for _ in range(6):
+        inverse = inverse * (2 - multiplier * inverse) % (1 << 64)
+    return np.uint64(inverse)
+
+
+def _powers(multiplier, count):
+    """First count powers of multiplier modulo 2**64, cached."""
+    table = _power_tables.get(multiplier)
+    if table is None or len(table) < count:
+        table = np.full(max(count, 1 << 16), multiplier, dtype=np.uint64)
+        table[0] = 1
+        with np.errstate(over='ignore'):
+            table = np.cumprod(table, dtype=np.uint64)
+        _power_tables[multiplier] = table
+    return table[:count]
+
+
+def _pc_keys(data, starts, ends):
+    """
+    Polynomial hashes, kept case and odd so that none is zero, of the byte
+    ranges starts to ends of data, shifted back to the start of each range
+    with the inverse powers of the multiplier.
+    """
+    with np.errstate(over='ignore'):
+        terms = _raw[data] * _powers(_pc_multiplier, len(data))
+        sums = np.concatenate(([np.uint64(0)], np.cumsum(terms, dtype=np.uint64)))
+        shift = _powers(_inverse(_pc_multiplier), len(data) + 1)[starts]
+        keys = (sums[ends] - sums[starts]) * shift + (ends - starts).astype(np.uint64)
+    return keys | np.uint64(1)
+
+
+def _block_index(data, base):
+    """
+    Index the non-empty lines of a block of a dump, which starts at a line
+    and ends after a newline or at the end of the dump.
+
+    :return: The byte offsets of the lines, their digests, the keys of their
+        pc, zero for lines without one, and the number of lines in the block.
+    """
+    starts = np.flatnonzero(data == 10) + 1
+    num_lines = len(starts)
+    if not len(starts) or starts[-1] != len(data):
+        starts = np.append(starts, len(data))
+        num_lines += 1
+    ends = starts
+    starts = np.concatenate(([0], ends[:-1]))
+
+    # digests of the lines without whitespace and lowercased, each summed
+    # over the whole block and shifted back to the first kept byte of its line
+    kept = ~_whitespace[data]
+    before = np.concatenate(([0], np.cumsum(kept)))
+    counts = before[ends] - before[starts]
+    nonempty = np.flatnonzero(counts)
+    starts = starts[nonempty]
+    ends = ends[nonempty]
+    counts = counts[nonempty]
+    firsts = before[starts]
+    chars = _lower[data[kept]]
+    digests = np.empty(len(nonempty), dtype=np.uint64)
+    if len(nonempty):
+        with np.errstate(over='ignore'):
+            sums = np.add.reduceat(chars * _powers(_multiplier, len(chars)), firsts)
+            shift = _powers(_inverse(_multiplier), len(chars))[firsts]
+            digests[:] = sums * shift + counts.astype(np.uint64)
+
+    # the pc of a line is the word right before its first " ("
+    keys = np.zeros(len(nonempty), dtype=np.uint64)
+    parens = np.flatnonzero((data[:-1] == 32) & (data[1:] == 40))
+    if len(nonempty) and len(parens):
+        paren = parens[np.minimum(np.searchsorted(parens, starts), len(parens) - 1)]
+        spaces = np.flatnonzero(_whitespace[data])
+        word = spaces[np.searchsorted(spaces, paren) - 1] + 1
+        word = np.maximum(np.where(word > paren, starts, word), starts)
+        valid = (paren >= starts) & (paren < ends) & (word < paren)
+        keys[valid] = _pc_keys(data, word[valid], paren[valid])
+    return starts.astype(np.int64) + base, digests, keys, num_lines
+
+
+class Trace():
+    """
+    Index of the records of a dump stored as NumPy columns, one entry per
+    non-empty line:
+
+    * ``offsets`` as int64, the byte offset of the line in the text dump
+    * ``norm`` as uint64, a digest of the line without whitespace and
+      lowercased.
+
+    Records with equal digests are equal to
+    :py:func:`river_core.utils.compare_dumps_native`, so two dumps are compared
+    with array operations and only the records whose digests differ are read
+    back from the text dumps and classified like the text comparison does.
+
+    The trace also holds a PC index, ``pc_keys`` and ``pc_first``: the sorted
+    hashes of the pcs of the dump, as written in it, and the first record with
+    each of them.
+    """
+
+    def __init__(self, offsets, norm, pc_keys, pc_first, source_hash='',
+                 num_lines=None):
+        """Constructor.
+
+        :param offsets: Byte offset of every record in the dump.
+
+        :param norm: Digest of every record without whitespace, lowercased.
+
+        :param pc_keys: Sorted hashes of the pcs in the dump.
+
+        :param pc_first: Index of the first record with each pc.
+
+        :param source_hash: Content hash of the dump the trace was parsed from.
+
+        :param num_lines: Number of lines in the dump the trace was parsed from.
+
+        :type offsets: numpy.ndarray
+
+        :type norm: numpy.ndarray
+
+        :type pc_keys: numpy.ndarray
+
+        :type pc_first: numpy.ndarray
+
+        :type source_hash: str
+
+        :type num_lines: int
+        """
+        self.offsets = offsets
+        self.norm = norm
+        self.pc_keys = pc_keys
+        self.pc_first = pc_first
+        self.source_hash = source_hash
+        self.num_lines = len(offsets) if num_lines is None else num_lines
+
+    @classmethod
+    def from_dump(cls, path):
+        """
+        Index a text dump, reading it once. Its content hash is taken from
+        :py:func:`river_core.dumpreader.content_hash` when already known, else
+        computed during the same pass and remembered.
+
+        :param path: Path to the dump.
+
+        :type path: str
+
+        :rtype: Trace
+        """
+        source_hash = known_content_hash(path)
+        hasher = None if source_hash else hashlib.blake2b(digest_size=16)
+        offsets = []
+        norm = []
+        keys = []
+        num_lines = 0
+        with DumpReader(path) as dump:
+            for start, block in dump.blocks():
+                if hasher is not None:
+                    hasher.update(block)
+                block_offsets, block_norm, block_keys, block_lines = _block_index(
+                    np.frombuffer(block, dtype=np.uint8), start)
+                offsets.append(block_offsets)
+                norm.append(block_norm)
+                keys.append(block_keys)
+                num_lines += block_lines
+        if hasher is not None:
+            source_hash = hasher.hexdigest()
+            remember_content_hash(path, source_hash)
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.uint64)
+        pc_keys, pc_first = np.unique(keys, return_index=True)
+        if len(pc_keys) and pc_keys[0] == 0:
+            pc_keys, pc_first = pc_keys[1:], pc_first[1:]
+        return cls(np.concatenate(offsets) if offsets else np.empty(0, dtype=np.int64),
+                   np.concatenate(norm) if norm else np.empty(0, dtype=np.uint64),
+                   pc_keys,
+                   pc_first.astype(np.int64),
+                   source_hash=source_hash,
+                   num_lines=num_lines)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a trace from a binary sidecar written by :py:meth:`save`.
+
+        :param path: Path to the sidecar.
+
+        :type path: str
+
+        :raise ValueError: If the sidecar has another layout version.
+
+        :rtype: Trace
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != TRACE_VERSION:
+                raise ValueError(f'{path}: trace version {int(data["version"])}')
+            return cls(data['offsets'],
+                       data['norm'],
+                       data['pc_keys'],
+                       data['pc_first'],
+                       source_hash=str(data['source_hash']),
+                       num_lines=int(data['num_lines']))
+
+    def save(self, path):
+        """
+        Write the trace as an uncompressed ``.npz`` archive. The file is
+        written atomically.
+
+        :param path: Path of the sidecar.
+
+        :type path: str
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as fd:
+            np.savez(fd,
+                     version=np.array(TRACE_VERSION, dtype=np.int64),
+                     offsets=self.offsets,
+                     norm=self.norm,
+                     pc_keys=self.pc_keys,
+                     pc_first=self.pc_first,
+                     source_hash=np.array(self.source_hash),
+                     num_lines=np.array(self.num_lines, dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """
+        Support slicing with a unit step, returning a trace that shares the
+        record columns of this one, without a PC index.
+        """
+        if not isinstance(index, slice):
+            raise TypeError('Trace only supports slicing')
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError('Trace slices must have a step of 1')
+        stop = max(start, stop)
+        return Trace(self.offsets[start:stop], self.norm[start:stop],
+                     self.pc_keys[:0], self.pc_first[:0])
+
+    def find_pc(self, pc):
+        """
+        Index of the first record whose pc is written as pc in the dump, the
+        word right before the first ``" ("`` of the record. Distinct pcs may
+        share a hash, so callers check the record they are given.
+
+        :param pc: The pc, e.g. ``0x0000000080000000``.
+
+        :type pc: str
+
+        :return: The index of the record or -1 if no record has that pc.
+
+        :rtype: int
+        """
+        data = np.frombuffer(pc.encode(), dtype=np.uint8)
+        if not len(data):
+            return -1
+        key = _pc_keys(data, np.array([0]), np.array([len(data)]))[0]
+        position = int(np.searchsorted(self.pc_keys, key))
+        if position < len(self.pc_keys) and self.pc_keys[position] == key:
+            return int(self.pc_first[position])
+        return -1
+
+    def find_offset(self, offset):
+        """
+        Index of the first record at or after a byte offset of the dump.
+
+        :param offset: The byte offset.
+
+        :type offset: int
+
+        :rtype: int
+        """
+        return int(np.searchsorted(self.offsets, offset))
+
+    def candidates(self, other):
+        """
+        Indices, over the common length of both traces, of the records which
+        differ beyond case and whitespace.
+
+        :param other: The trace to compare against.
+
+        :type other: Trace
+
+        :rtype: numpy.ndarray
+        """
+        n = min(len(self), len(other))
+        return np.flatnonzero(self.norm[:n] != other.norm[:n])
+
+
+def sidecar_path(dump_path):
+    """
+    Path of the binary sidecar belonging to a text dump.
+
+    :param dump_path: Path to the text dump.
+
+    :type dump_path: str
+
+    :rtype: str
+    """
+    return dump_path + SIDECAR_SUFFIX
+
+
+def convert_dump(dump_path):
+    """
+    Index a text dump and write its binary sidecar.
+
+    :param dump_path: Path to the text dump.
+
+    :type dump_path: str
+
+    :rtype: Trace
+    """
+    trace = Trace.from_dump(dump_path)
+    trace.save(sidecar_path(dump_path))
+    return trace
+
+
+def load_trace(dump_path, convert=False):
+    """
+    Load the binary sidecar of a dump, provided it exists and the content hash
+    recorded in it matches the text dump.
+
+    :param dump_path: Path to the text dump.
+
+    :param convert: Convert the dump when its sidecar is missing, unreadable
+        or stale. A sidecar which cannot be written is not an error.
+
+    :type dump_path: str
+
+    :type convert: bool
+
+    :return: The trace or None if the sidecar is missing, unreadable or stale
+        and convert is not set.
+
+    :rtype: Trace
+    """
+    path = sidecar_path(dump_path)
+    trace = None
+    if os.path.isfile(path):
+        try:
+            trace = Trace.load(path)
+        except (OSError, ValueError, KeyError):
+            trace = None
+        if trace is not None and trace.source_hash != content_hash(dump_path):
+            trace = None
+    if trace is None and convert:
+        trace = Trace.from_dump(dump_path)
+        try:
+            trace.save(path)
+        except OSError:
+            pass
+    return trace
+
+
+def remove_sidecar(dump_path):
+    """
+    Remove the binary sidecar of a dump, if any. Plugins deleting dumps, e.g.
+    in their ``post_run`` hook, should remove the sidecars along with them.
+
+    :param dump_path: Path to the text dump.
+
+    :type dump_path: str
+    """
+    try:
+        os.remove(sidecar_path(dump_path))
+    except FileNotFoundError:
+        pass
@@ -5,48 +5,105 @@ import os
 import subprocess
 import shlex
 from river_core.log import logger
+import river_core.profiling as profiling
+from river_core.dumpreader import DumpReader, count_lines, CHUNK_SIZE
+from river_core.trace import load_trace
+from river_core.constants import dump_regex, output_tail_size, kill_grace_period, kill_poll_interval, yaml_cache_min_age
+from river_core.mismatch import Mismatch, BASE_MISMATCH, STATE_MISMATCH, MISSING, format_mismatches
+from river_core.testlist import TestList, is_test_list_db
 import distutils.util
 import ruamel
 import signal
 from ruamel.yaml import YAML
-from threading import Timer
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+import shutil
 import pathlib
 import shlex
 import riscv_config.isa_validator as isa_val
-import re
+import collections
+import selectors
+import time
+import asyncio
+import itertools
+import marshal
+import contextlib
+import numpy as np
 
-dump_regex = re.compile(r'.*core\s*(?P<coreid>\d):\s*(?P<priv>\d)\s*(?P<pc>.*?)\s+\((?P<instr>.*?)\)(?P<change>.*?)$')
+
+# lookup table flagging the bytes which make a signature word non-zero
+_nonzero_bytes = np.ones(256, dtype=bool)
+_nonzero_bytes[np.frombuffer(b'0 \t\r\n\v\f', dtype=np.uint8)] = False
 
 yaml = YAML(typ="safe")
 yaml.default_flow_style = False
 yaml.allow_unicode = True
 
-def self_check(file1):
+def self_check(file1, fail_fast=False, limit=0):
   '''
   Function to check if all values in the signature are 0s to indicate a pass,
-  else the test has failed.
+  else the test has failed. Every line with a non-zero value is reported.
+
+  :param file1: The path to the signature.
+  :param fail_fast: Stop checking at the first non-zero value.
+  :param limit: Maximum number of non-zero lines to report, 0 for all of them.
+  :type file1: str
+  :type fail_fast: bool
+  :type limit: int
+  :return: "Passed" or "Failed" and the lines with non-zero values.
+  '''
+  faults = signature_faults(file1, fail_fast)
+  if len(faults) == 0:
+    return 'Passed', ''
+  shown = faults[:limit] if limit else faults
+  rout = ''.join(f'\nLine:{lineno} has a non-zero value indicating a fail' for lineno in shown)
+  if len(shown) < len(faults):
+    rout += f'\n... {len(faults) - len(shown)} more lines with non-zero values'
+  return 'Failed', rout
+
+def signature_faults(file1, fail_fast=False):
+  '''
+  Line numbers, counted from 0, of the non-zero words of a self-checking
+  signature. A word is zero when all its hex digits are 0, so the words are
+  not parsed and can be of any width. The signature is scanned in blocks of
+  :py:data:`river_core.dumpreader.CHUNK_SIZE` bytes with NumPy.
+
+  :param file1: The path to the signature.
+  :param fail_fast: Stop scanning at the first block holding a non-zero word
+      and return only the first non-zero line.
+  :type file1: str
+  :type fail_fast: bool
+  :rtype: numpy.ndarray
   '''
-  result = 'Passed'
-  rout = ''
-  with open(file1,'r') as f:
-    for lineno, line in enumerate(f):
-      line_val = f'0x{line}'
-      if int(line_val,0) != 0:
-        result = 'Failed'
-        rout = f'\nLine:{lineno} has a non-zero value indicating a fail'
-  return result, rout
+  faults = []
+  if os.path.getsize(file1):
+    data = np.memmap(file1, dtype=np.uint8, mode='r')
+    lines_before = 0
+    for start in range(0, len(data), CHUNK_SIZE):
+      chunk = data[start:start + CHUNK_SIZE]
+      newlines = np.flatnonzero(chunk == ord('\n'))
+      nonzero = np.flatnonzero(_nonzero_bytes[chunk])
+      if len(nonzero):
+        faults.append(np.unique(lines_before + np.searchsorted(newlines, nonzero)))
+        if fail_fast:
+          break
+      lines_before += len(newlines)
+  if not faults:
+    return np.empty(0, dtype=np.int64)
+  faults = np.unique(np.concatenate(faults))
+  return faults[:1] if fail_fast else faults
 
 def get_file_size(file):
     '''
     Function to give the number of lines
     '''
-    with open(f'{file}','r') as fd:
-      rcount = len(fd.readlines())
-    return rcount
+    return count_lines(file)
 
 def compare_dumps(file1, file2, start_hex=''):
     '''
-        Function to check whether two dump files are equivalent. This funcion ucore\s*(?P<coreid>\d):\s*(?P<priv>\d)\s*(?P<pc>.*?)\s+\((?P<instr>.*?)\)(?P<change>.*?)$ses the
+        Function to check whether two dump files are equivalent. This function uses
+        ``diff -iw`` and aligns the records of every hunk of its output in a
+        single linear pass.
         :param file1: The path to the first signature.
         :param file2: The path to the second signature.
         :type file1: str
@@ -59,107 +116,128 @@ def compare_dumps(file1, file2, start_hex=''):
         raise SystemExit(1)
     if start_hex == '':
         cmd = f'diff -iw {file1} {file2}'
+        errcode, rout, rerr = sys_command(cmd, logging=False)
     else:
-        trim_cmd = "sed -n \'/{start_hex} (/,$p\' {file}"
-
-        file1_trimmed = file1 + '_trimmed'
-        file2_trimmed = file2 + '_trimmed'
-
-        cmd1 = trim_cmd.format(start_hex = start_hex, file=file1)
-        code = sys_command_file(cmd1, filename=file1_trimmed)
-        if code[0]:    
-            assert False, f"{cmd1} has failed with code {code}"
-
-        cmd2 = trim_cmd.format(start_hex = start_hex, file=file2)
-        code = sys_command_file(cmd2, filename=file2_trimmed)
-        if code[0]:
-            assert False, f"{cmd2} has failed with code {code}"
-        
-        cmd = f'diff -iw {file1_trimmed} {file2_trimmed}'
-
-    errcode, rout, rerr = sys_command(cmd, logging=False)
+        # trimming is a seek to the first record at start_hex, no copies are made
+        start_marker = f'{start_hex} ('.encode()
+        offsets = []
+        for dump_file in [file1, file2]:
+            with DumpReader(dump_file) as dump:
+                offset = dump.find(start_marker)
+                offsets.append(len(dump) if offset < 0 else offset)
+        errcode, rout, rerr = _diff_from_offsets(file1, offsets[0], file2, offsets[1])
 
     status = 'Passed'
     if errcode != 0 and rout != '':
         logger.warning(f"Possible Differences found in {file1} and {file2}")
-        rout += '\nMismatch infos:'
-        mismatch_str_lst = list(filter(lambda x: x[0] in ['<', '>'], rout.split('\n')))
-        start_val = -1
-        flag_found_corr_file1 = False
-        for i in range(len(mismatch_str_lst)):
-            file1_str = mismatch_str_lst[i]
-            if file1_str[0] != '<':
-                continue
-            else:
-                flag_found_corr_file1 = True
-
-            try:
-                file1_dat = dump_regex.findall(file1_str)[0]
-                logger.debug(f"-- Processing line from {os.path.basename(file1)}: {file1_dat}")
-            except IndexError:
-                status = 'Failed'
-                logger.debug(f"-- Failed to parse line from {os.path.basename(file1)}: {file1_str}")
-                break
-
-            flag_found_corr_file2 = False
-            for j in range(start_val + 1, len(mismatch_str_lst)):
-                file2_str = mismatch_str_lst[j]
-                if file2_str[0] != '>':
-                    continue
-                else:
-                    flag_found_corr_file2 = True
-                    start_val = j
-
-                try:
-                    file2_dat = dump_regex.findall(file2_str)[0]
-                    logger.debug(f"-- Processing line from {os.path.basename(file2)}: {file2_dat}")
-                except IndexError:
-                    status = 'Failed'
-                    logger.debug(f"-- Failed to parse line from {os.path.basename(file2)}: {file2_str}")
-                    break
-                logger.debug(f"-- Comparing {os.path.basename(file1)}:{file1_dat[0]} {file1_dat[1]} {file1_dat[2]} {file1_dat[3]} vs "
-                             f"{os.path.basename(file2)}:{file2_dat[0]} {file2_dat[1]} {file2_dat[2]} {file2_dat[3]}")
-                
-                if file1_dat[0:4] != file2_dat[0:4]:
-                    rout += f'\nBM: {file1} at PC: {file1_dat[2]} and {file2} at PC: {file2_dat[2]}'
-                    status = 'Failed'
-                    logger.debug(f"-- Mismatch in coreid, priv, pc or instruction between {file1} and {file2}")
-                else:
-                    change1 = file1_dat[-1].split()
-                    if len(change1) % 2:
-                        change1.remove('mem')
-
-                    file1dat_iter = iter(change1)
-                    file2dat_iter = iter(file2_dat[-1].split())
-                    file1_change = dict(zip(file1dat_iter, file1dat_iter))
-                    file2_change = dict(zip(file2dat_iter, file2dat_iter))
-
-                    if file1_change != file2_change:
-                        rout += f'\nSM: at PC: {file1_dat[2]}'
-                        status = 'Failed'
-                        logger.debug(f"-- Mismatch in architectural change at PC: {file1_dat[2]}")
-                    
-                    rout += f'\nBM: Strings Match at PC: {file1_dat[2]}'
-
-                break
-
-            if not flag_found_corr_file2:
-                status = 'Failed'
-                rout += f'\nBM: {file1} at PC: {file1_dat[2]} and missing in {file2}'
-                logger.debug(f"-- Missing corresponding entry in {file2} for PC: {file1_dat[2]}")
-
-        if not flag_found_corr_file1:
+        mismatches = []
+        for lines1, lines2 in _diff_hunks(rout):
+            # records of a hunk are aligned positionally, the rest are missing
+            for line1, line2 in zip(lines1, lines2):
+                mismatch = _classify_dump_mismatch(line1, line2)
+                if mismatch is not None:
+                    mismatches.append(mismatch)
+            for line1 in lines1[len(lines2):]:
+                mismatches.append(Mismatch(MISSING, dut=line1))
+                logger.debug(f"-- Missing corresponding entry in {file2} for PC: {mismatches[-1].pc}")
+            for line2 in lines2[len(lines1):]:
+                mismatches.append(Mismatch(MISSING, ref=line2))
+                logger.debug(f"-- Missing corresponding entry in {file1}")
+        if mismatches:
             status = 'Failed'
-            rout += f'\nBM: Missing entry in {file1}'
-            logger.debug(f"-- Missing corresponding entry in {file1}")
+        rout += format_mismatches(mismatches, file1, file2)
     
     # get number of instructions executed
-    with open(f'{file1}','r') as fd:
-      rcount = len(fd.readlines())
+    rcount = count_lines(file1)
     
     return status, rout, rcount
 
 
+def _diff_from_offsets(file1, offset1, file2, offset2, timeout=240):
+    '''
+    Run ``diff -iw`` on two files starting at the given byte offsets. The
+    contents are streamed to diff through pipes so no trimmed copies of the
+    files are written.
+
+    :param file1: The path to the first file.
+    :param offset1: Byte offset in the first file.
+    :param file2: The path to the second file.
+    :param offset2: Byte offset in the second file.
+    :param timeout: Seconds after which diff is killed.
+    :type file1: str
+    :type offset1: int
+    :type file2: str
+    :type offset2: int
+    :type timeout: int
+    :returns: Error Code (int) ; STDOUT ; STDERR
+    :rtype: list
+    '''
+    def feed(path, offset, fd):
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                src.seek(offset)
+                shutil.copyfileobj(src, dst)
+        except BrokenPipeError:
+            pass
+
+    read1, write1 = os.pipe()
+    read2, write2 = os.pipe()
+    cmd = ['diff', '-iw', f'/dev/fd/{read1}', f'/dev/fd/{read2}']
+    logger.debug('$ {0} # {1}@{2} {3}@{4}'.format(' '.join(cmd), file1, offset1,
+                                                   file2, offset2))
+    try:
+        process = subprocess.Popen(cmd,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   pass_fds=(read1, read2),
+                                   start_new_session=True)
+    finally:
+        os.close(read1)
+        os.close(read2)
+    feeders = [Thread(target=feed, args=(file1, offset1, write1), daemon=True),
+               Thread(target=feed, args=(file2, offset2, write2), daemon=True)]
+    for feeder in feeders:
+        feeder.start()
+    with _group_guard(process):
+        try:
+            out, err = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            terminate_process_group(process)
+            process.communicate()
+            logger.error("Command did not exit within {0} seconds: {1}".format(timeout, ' '.join(cmd)))
+            return 1, "GuruMeditation", "TimeoutExpired"
+    for feeder in feeders:
+        feeder.join()
+    return (process.returncode, out.decode(errors='replace').rstrip(),
+            err.decode(errors='replace').rstrip())
+
+
+def _diff_hunks(diff_out):
+    '''
+    Generator over the hunks of a normal format ``diff`` output.
+
+    :param diff_out: Output of ``diff``.
+    :type diff_out: str
+    :return: One (lines from file1, lines from file2) tuple per hunk, with the
+        ``<``/``>`` markers removed.
+    :rtype: tuple
+    '''
+    lines1 = []
+    lines2 = []
+    for line in diff_out.split('\n'):
+        if line[:1] == '<':
+            lines1.append(line[2:])
+        elif line[:1] == '>':
+            lines2.append(line[2:])
+        elif line[:1].isdigit():
+            if lines1 or lines2:
+                yield lines1, lines2
+            lines1 = []
+            lines2 = []
+    if lines1 or lines2:
+        yield lines1, lines2
+
+
 def compare_dumps_bash(file1, file2, start_hex = ''):
     '''
     Function to check whether two dump files are equivalent. This function uses
@@ -288,34 +366,332 @@ def compare_dumps_bash(file1, file2, start_hex = ''):
         rout = '\n'.join(lines[1:])
 
     # get number of instructions executed
-    with open(file1, 'r') as fd:
-        rcount = len(fd.readlines())
+    rcount = count_lines(file1)
 
     return status, rout, rcount
 
+def _dump_change_dict(change, drop_mem=False):
+    '''
+    Convert the architectural change section of a commit record into a dict
+    of ``{register/address: value}``. When ``drop_mem`` is set and the number
+    of tokens is odd, the dangling ``mem`` keyword is dropped first.
+    '''
+    tokens = change.split()
+    if drop_mem and len(tokens) % 2 and 'mem' in tokens:
+        tokens.remove('mem')
+    token_iter = iter(tokens)
+    return dict(zip(token_iter, token_iter))
+
+
+def _classify_dump_mismatch(line1, line2):
+    '''
+    Classify a pair of commit records that differ textually.
+
+    :param line1: The record from the first dump.
+    :param line2: The record from the second dump.
+    :return: A :py:class:`river_core.mismatch.Mismatch` if the records are
+        architecturally different, else None.
+    :rtype: Mismatch
+    '''
+    try:
+        file1_dat = dump_regex.findall(line1)[0]
+        file2_dat = dump_regex.findall(line2)[0]
+    except IndexError:
+        logger.debug(f"-- Failed to parse lines: {line1} / {line2}")
+        return Mismatch(BASE_MISMATCH, line1, line2)
+
+    if file1_dat[0:4] != file2_dat[0:4]:
+        logger.debug(f"-- Mismatch in coreid, priv, pc or instruction at PC: {file1_dat[2]}")
+        return Mismatch(BASE_MISMATCH, line1, line2)
+    if _dump_change_dict(file1_dat[-1], drop_mem=True) != _dump_change_dict(file2_dat[-1]):
+        logger.debug(f"-- Mismatch in architectural change at PC: {file1_dat[2]}")
+        return Mismatch(STATE_MISMATCH, line1, line2)
+    return None
+
+
+def compare_dumps_native(file1, file2, start_hex='', max_mismatches=10, context=0,
+                         structured=False):
+    '''
+    Function to check whether two dump files are equivalent without spawning
+    any external process. Both dumps are memory mapped through
+    :py:class:`river_core.dumpreader.DumpReader` and walked line by line in
+    lockstep, records which differ (ignoring case and whitespace, like
+    ``diff -iw``) are parsed once with :py:data:`dump_regex` and classified.
+    The identical leading part of the dumps is skipped a block at a time, so
+    that only the records from the first difference onwards are walked.
+
+    :param file1: The path to the first dump.
+    :param file2: The path to the second dump.
+    :param start_hex: PC from which the comparison should start. Records before
+        the first occurrence of this PC in each dump are skipped.
+    :param max_mismatches: Number of failing records after which the comparison
+        stops. The lines of file1 are still counted completely. A value of 0
+        compares the complete dumps.
+    :param context: Number of records before and after the first mismatch to
+        be included in the log.
+    :param structured: Return the list of
+        :py:class:`river_core.mismatch.Mismatch` records instead of the log.
+    :type file1: str
+    :type file2: str
+    :type start_hex: str
+    :type max_mismatches: int
+    :type context: int
+    :type structured: bool
+    :return: A string indicating whether the test "Passed" or "Failed", the
+        mismatch log (or records) and the number of lines in file1.
+    :rtype: tuple
+    '''
+    if not os.path.exists(file1) :
+        logger.error('Signature file : ' + file1 + ' does not exist')
+        raise SystemExit(1)
+
+    mismatches = []
+    start_marker = f'{start_hex} ('.encode() if start_hex else b''
+    history = collections.deque(maxlen=context + 1)
+    context_before = None
+    context_after = []
+
+    with DumpReader(file1) as dump1, DumpReader(file2) as dump2:
+        rcount = dump1.count_lines()
+        offset1 = offset2 = 0
+        if start_marker:
+            # nothing is compared from a dump which never reaches the start pc
+            offset1 = dump1.find(start_marker)
+            offset1 = len(dump1) if offset1 < 0 else offset1
+            offset2 = dump2.find(start_marker)
+            offset2 = len(dump2) if offset2 < 0 else offset2
+        same = dump1.common_prefix(dump2, offset1, offset2)
+        if offset1 + same == len(dump1) and offset2 + same == len(dump2):
+            iter1 = iter2 = iter(())
+        else:
+            # identical records before the first difference only matter as
+            # its context
+            skip = dump1.line_start(offset1 + same, context) - offset1
+            skip = max(skip, 0)
+            iter1 = dump1.records(offset1 + skip)
+            iter2 = dump2.records(offset2 + skip)
+
+        for line1 in iter1:
+            if not line1 or line1.isspace():
+                continue
+            line2 = next(iter2, None)
+            while line2 is not None and (not line2 or line2.isspace()):
+                line2 = next(iter2, None)
+            if line2 is None:
+                mismatches.append(Mismatch(MISSING, dut=line1.decode(errors='replace')))
+                logger.debug(f"-- Missing corresponding entry in {file2} for PC: {mismatches[-1].pc}")
+                if context and context_before is None:
+                    context_before = list(history)[-context:] + [(line1, b'')]
+                break
+            if context_before is not None and len(context_after) < context:
+                context_after.append((line1, line2))
+            history.append((line1, line2))
+            if line1 == line2 or \
+                    b''.join(line1.split()).lower() == b''.join(line2.split()).lower():
+                continue
+            mismatch = _classify_dump_mismatch(line1.decode(errors='replace'),
+                                               line2.decode(errors='replace'))
+            if mismatch is not None:
+                mismatches.append(mismatch)
+                if context and context_before is None:
+                    context_before = list(history)
+                if max_mismatches and len(mismatches) >= max_mismatches:
+                    break
+        else:
+            for line2 in iter2:
+                if line2.strip():
+                    mismatches.append(Mismatch(MISSING, ref=line2.decode(errors='replace')))
+                    logger.debug(f"-- Missing corresponding entry in {file1}")
+                    if context and context_before is None:
+                        context_before = list(history)[-context:] + [(b'', line2)]
+                    break
+
+        # read ahead when the comparison stopped early, pairing the non-empty
+        # records as the walk does
+        for line1, line2 in zip((x for x in iter1 if x and not x.isspace()),
+                                (x for x in iter2 if x and not x.isspace())):
+            if context_before is None or len(context_after) >= context:
+                break
+            context_after.append((line1, line2))
+
+    if context_before is not None:
+        mismatches[0].context = (
+            [(x.decode(errors='replace'), y.decode(errors='replace')) for x, y in context_before],
+            [(x.decode(errors='replace'), y.decode(errors='replace')) for x, y in context_after])
+    status = 'Failed' if mismatches else 'Passed'
+    if mismatches:
+        logger.warning(f"Differences found in {file1} and {file2}")
+    if structured:
+        return status, mismatches, rcount
+    return status, format_mismatches(mismatches, file1, file2), rcount
+
+
+def compare_dumps_trace(file1, file2, start_hex='', max_mismatches=10, context=0,
+                        structured=False, convert=False):
+    '''
+    Function to check whether two dump files are equivalent using the binary
+    sidecars written by :py:func:`river_core.trace.convert_dump`. The sidecars
+    are used only when their content hash matches the text dumps, else the
+    comparison falls back to :py:func:`compare_dumps_native`, whose verdict
+    and mismatches the sidecars reproduce: the start pc is looked up in their
+    PC index and the mismatching records are read back from the text dumps.
+
+    :param file1: The path to the first dump.
+    :param file2: The path to the second dump.
+    :param start_hex: PC from which the comparison should start.
+    :param max_mismatches: Number of failing records after which the comparison
+        stops. A value of 0 compares the complete dumps.
+    :param context: Number of records before and after the first mismatch to
+        be included in the log.
+    :param structured: Return the list of
+        :py:class:`river_core.mismatch.Mismatch` records instead of the log.
+    :param convert: Write the sidecars which are missing or stale instead of
+        falling back to the text comparison.
+    :type file1: str
+    :type file2: str
+    :type start_hex: str
+    :type max_mismatches: int
+    :type context: int
+    :type structured: bool
+    :type convert: bool
+    :return: A string indicating whether the test "Passed" or "Failed", the
+        mismatch log (or records) and the number of lines in file1.
+    :rtype: tuple
+    '''
+    trace1 = load_trace(file1, convert) if os.path.exists(file1) else None
+    trace2 = load_trace(file2, convert) if trace1 is not None and os.path.exists(file2) else None
+    if trace2 is None:
+        return compare_dumps_native(file1, file2, start_hex, max_mismatches, context,
+                                    structured)
+    logger.debug(f"-- Using binary traces of {file1} and {file2}")
+
+    rcount = trace1.num_lines
+    with DumpReader(file1) as dump1, DumpReader(file2) as dump2:
+        if start_hex:
+            # nothing is compared from a dump which never reaches the start pc
+            trace1 = trace1[_trace_start(dump1, trace1, start_hex):]
+            trace2 = trace2[_trace_start(dump2, trace2, start_hex):]
+
+        mismatches = []
+        first = -1
+        capped = False
+        # records equal beyond case and whitespace are equal, the others are
+        # read back and classified like the text comparison does
+        for index in trace1.candidates(trace2):
+            mismatch = _classify_dump_mismatch(_trace_line(dump1, trace1, index),
+                                               _trace_line(dump2, trace2, index))
+            if mismatch is None:
+                continue
+            mismatches.append(mismatch)
+            if first < 0:
+                first = index
+            if max_mismatches and len(mismatches) >= max_mismatches:
+                capped = True
+                break
+        if not capped and len(trace1) != len(trace2):
+            missing = min(len(trace1), len(trace2))
+            if len(trace1) > len(trace2):
+                mismatches.append(Mismatch(MISSING, dut=_trace_line(dump1, trace1, missing)))
+            else:
+                mismatches.append(Mismatch(MISSING, ref=_trace_line(dump2, trace2, missing)))
+            if first < 0:
+                first = missing
+
+        if context and first >= 0:
+            before = range(max(0, first - context), first + 1)
+            after = range(first + 1, min(first + 1 + context, len(trace1), len(trace2)))
+            mismatches[0].context = (
+                [(_trace_line(dump1, trace1, i), _trace_line(dump2, trace2, i)) for i in before],
+                [(_trace_line(dump1, trace1, i), _trace_line(dump2, trace2, i)) for i in after])
+    status = 'Failed' if mismatches else 'Passed'
+    if mismatches:
+        logger.warning(f"Differences found in {file1} and {file2}")
+    if structured:
+        return status, mismatches, rcount
+    return status, format_mismatches(mismatches, file1, file2), rcount
+
+
+def _trace_start(dump, trace, start_hex):
+    '''
+    Index of the first record of a :py:class:`river_core.trace.Trace` which
+    the text comparison starts from, i.e. the first line holding the start pc
+    followed by ``" ("``, or the length of the trace if there is none. The
+    record is looked up in the PC index of the trace, and only the text before
+    it is searched, for the rare lines holding the same text elsewhere than as
+    their pc.
+    '''
+    marker = f'{start_hex} ('.encode()
+    index = trace.find_pc(start_hex)
+    end = int(trace.offsets[index]) if index >= 0 else len(dump)
+    offset = dump.find(marker, 0, end)
+    if offset < 0 and index >= 0:
+        # the index is keyed on hashes, the record is checked against the text
+        line = next(dump.records(end), b'')
+        offset = end if marker in line else dump.find(marker, end)
+    return trace.find_offset(offset) if offset >= 0 else len(trace)
+
+
+def _trace_line(dump, trace, index):
+    '''
+    Read the record at index of a :py:class:`river_core.trace.Trace` back from
+    its text dump, or an empty string if the trace has no record at index.
+    '''
+    if index >= len(trace):
+        return ''
+    line = next(dump.records(int(trace.offsets[index])), b'')
+    return line.decode(errors='replace')
+
+
 def compare_signature(file1, file2):
     '''
-        Function to check whether two signature files are equivalent. This funcion uses the
+        Function to check whether two signature files are equivalent. The
+        signatures are compared word by word (one word per line) in a single
+        pass, ignoring case and white space like ``diff -iw``.
         :param file1: The path to the first signature.
-        :param file2: The path to the second signature.raise
+        :param file2: The path to the second signature.
+        :type file1: str
+        :type file2: str
         :return: A string indicating whether the test "Passed" (if files are the same)
-            or "Failed" (if the files are different) and the diff of the files.
+            or "Failed" (if the files are different), the location of the first
+            differing word and the number of lines in the first signature.
     '''
     if not os.path.exists(file1) :
         logger.error('Signature file : ' + file1 + ' does not exist')
         raise SystemExit(1)
-    cmd = f'diff -iw {file1} {file2}'
-    errcode, rout, rerr = sys_command(cmd, logging=False)
-    if errcode != 0:
-        status = 'Failed'
-    else:
-        status = 'Passed'
-
-    # number of lines in the signature file
-    with open(f'{file1}','r') as fd:
-      rcount = len(fd.readlines())
-    
-    return status, rout, rcount
+    if not os.path.exists(file2):
+        return 'Failed', f'\nSignature file : {file2} does not exist', count_lines(file1)
+    rcount = 0
+    differing = 0
+    first = None
+    offset1 = offset2 = 0
+    with DumpReader(file1) as sig1, DumpReader(file2) as sig2:
+        for lineno, (word1, word2) in enumerate(
+                itertools.zip_longest(sig1.records(), sig2.records())):
+            if word1 != word2 and (word1 is None or word2 is None or
+                                   _signature_word(word1) != _signature_word(word2)):
+                differing += 1
+                if first is None:
+                    first = (lineno, offset1, word1, offset2, word2)
+            if word1 is not None:
+                rcount += 1
+                offset1 += len(word1) + 1
+            if word2 is not None:
+                offset2 += len(word2) + 1
+    if first is None:
+        return 'Passed', '', rcount
+    lineno, offset1, word1, offset2, word2 = first
+    word1 = 'missing' if word1 is None else word1.decode(errors='replace').strip()
+    word2 = 'missing' if word2 is None else word2.decode(errors='replace').strip()
+    rout = (f'\nFirst differing word at line {lineno}: {file1} offset {offset1}: {word1}'
+            f' and {file2} offset {offset2}: {word2}'
+            f'\n{differing} differing words')
+    return 'Failed', rout, rcount
+
+def _signature_word(word):
+    '''
+        Normalise a signature word the way ``diff -iw`` compares lines.
+    '''
+    return word.translate(None, b' \t\r\v\f').lower()
 
 def str_2_bool(string):
     """
@@ -349,11 +725,33 @@ def save_yaml(data, out_file):
         logger.error("File doesn't exist")
 
 
+def yaml_cache_file(input_yaml):
+    """
+        Path of the parse cache of a YAML file, see :py:func:`load_yaml`
+
+        :param input_yaml: The YAML file
+
+        :type input_yaml: str
+
+        :rtype: str
+    """
+    head, tail = os.path.split(input_yaml)
+    return os.path.join(head, '.' + tail + '.cache')
+
+
 def load_yaml(input_yaml):
     """
         Save a dict to a file
 
-        :param input_yaml: YAML file to read 
+        The parsed content is cached next to the YAML file, see
+        :py:func:`yaml_cache_file`, and served to later loads, in this or
+        other processes, for as long as the path, size and modification time
+        of the file are unchanged. The cache is a :py:mod:`marshal` file,
+        which is not safe against erroneous or malicious data, so YAML files
+        must only be loaded from directories written by trusted runs.
+
+        :param input_yaml: YAML file to read. A test list store, see
+            :py:class:`river_core.testlist.TestList`, is read as well.
 
         :type input_yaml: str 
 
@@ -361,11 +759,36 @@ def load_yaml(input_yaml):
 
         :rtype: dict
     """
+    if is_test_list_db(input_yaml):
+        with TestList(input_yaml) as test_list:
+            return test_list.to_dict()
+    cache_file = yaml_cache_file(input_yaml)
+    try:
+        stat = os.stat(input_yaml)
+        key = (os.path.realpath(input_yaml), stat.st_size, stat.st_mtime_ns)
+        with open(cache_file, 'rb') as fd:
+            cached_key, data = marshal.load(fd)
+        if tuple(cached_key) == key:
+            return data
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
     try:
         with open(input_yaml, "r") as file:
-            return dict(yaml.load(file))
+            data = dict(yaml.load(file))
     except ruamel.yaml.constructor.DuplicateKeyError as msg:
         raise SystemExit(1)
+    # a file modified within the timestamp granularity may change again
+    # without its key changing
+    if time.time_ns() - key[2] > yaml_cache_min_age * 10**9:
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_file, 'wb') as fd:
+                marshal.dump((key, data), fd)
+            os.replace(tmp_file, cache_file)
+        except (OSError, ValueError):
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    return data
 
 
 def check_isa(isa):
@@ -375,7 +798,214 @@ def check_isa(isa):
         logger.error(e)
       raise SystemExit(1)
 
-def sys_command(command, timeout=240, logging=True):
+def _decode_output(data, stream, returncode, logging=True, errors='strict',
+                   cwd=None):
+    '''
+        Decode the captured output of a command once and log it, as an error if
+        the command failed. Output which cannot be decoded is written to
+        ``<stream>.log`` in cwd instead.
+
+        :param data: The captured output.
+
+        :param stream: ``stdout`` or ``stderr``.
+
+        :param returncode: The return code of the command.
+
+        :param logging: Log the decoded output.
+
+        :param errors: Error handling scheme of :py:meth:`bytes.decode`.
+
+        :param cwd: Directory of the command, the current directory if None.
+
+        :type data: bytes
+
+        :type stream: str
+
+        :type returncode: int
+
+        :type logging: bool
+
+        :type errors: str
+
+        :type cwd: str
+
+        :returns: The decoded output or a pointer to the file it was written to.
+
+        :rtype: str
+    '''
+    encoding = getattr(sys, stream).encoding
+    fmt = encoding if encoding is not None else 'utf-8'
+    try:
+        text = data.decode(fmt, errors)
+    except UnicodeError:
+        log_file = (cwd or os.getcwd()) + f'/{stream}.log'
+        msg = f'Unable to decode {stream.upper()} for launched subprocess. Output written to:' + log_file
+        if logging:
+            logger.warning(msg)
+        with open(log_file, 'wb') as f:
+            f.write(data)
+        return msg
+    if text and logging:
+        if returncode != 0:
+            logger.error(text)
+        else:
+            logger.debug(text)
+    return text
+
+def terminate_process_group(process, grace=kill_grace_period):
+    '''
+        Kill a timed out command along with every process it started. The
+        command must have been started in its own session, so that its process
+        group holds all its descendants. The group is sent SIGTERM, and SIGKILL
+        if any of its members is still alive after grace seconds. The group is
+        checked at growing intervals, up to kill_poll_interval seconds.
+
+        :param process: The process leading the group.
+
+        :param grace: Seconds to wait after SIGTERM before SIGKILL.
+
+        :type process: subprocess.Popen
+
+        :type grace: float
+
+        :returns: Seconds taken until the whole group was gone.
+
+        :rtype: float
+    '''
+    start = time.monotonic()
+    _signal_group(process.pid, signal.SIGTERM)
+    for delay in _kill_poll_delays(grace):
+        try:
+            # wait() rather than poll() so that the child is reaped with wait4
+            process.wait(timeout=delay)
+        except subprocess.TimeoutExpired:
+            continue
+        if not _group_alive(process.pid):
+            break
+        # the leader is gone but not the rest of its group
+        time.sleep(delay)
+    else:
+        _kill_group(process.pid, grace)
+        process.wait()
+    latency = time.monotonic() - start
+    logger.debug(f'Process group {process.pid} killed in {latency:.3f} seconds')
+    return latency
+
+async def _terminate_process_group_async(process, grace=kill_grace_period):
+    '''
+        Coroutine counterpart of :py:func:`terminate_process_group` for
+        :py:mod:`asyncio` subprocesses.
+    '''
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    _signal_group(process.pid, signal.SIGTERM)
+    for delay in _kill_poll_delays(grace):
+        try:
+            await asyncio.wait_for(process.wait(), delay)
+        except asyncio.TimeoutError:
+            continue
+        # /proc is scanned off the event loop
+        if not await loop.run_in_executor(None, _group_alive, process.pid):
+            break
+        await asyncio.sleep(delay)
+    else:
+        _kill_group(process.pid, grace)
+        await process.wait()
+    latency = time.monotonic() - start
+    logger.debug(f'Process group {process.pid} killed in {latency:.3f} seconds')
+    return latency
+
+def _kill_poll_delays(grace):
+    '''
+        Seconds to wait before each check of a process group sent SIGTERM,
+        doubling up to kill_poll_interval since checking :file:`/proc` is
+        costly, until grace seconds have passed.
+
+        :type grace: float
+    '''
+    deadline = time.monotonic() + grace
+    delay = 0.01
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        yield min(delay, remaining)
+        delay = min(delay * 2, kill_poll_interval)
+
+def _kill_group(pgid, grace):
+    '''
+        Send SIGKILL to a process group which outlived its grace period.
+    '''
+    logger.warning(f'Process group {pgid} still alive {grace} seconds after SIGTERM, sending SIGKILL')
+    _signal_group(pgid, signal.SIGKILL)
+
+@contextlib.contextmanager
+def _group_guard(process):
+    '''
+        Terminate the process group of a command if the caller is interrupted
+        while waiting for it, e.g. by Ctrl-C or SIGTERM, which do not reach a
+        command in its own session, and let the exception through.
+
+        :type process: subprocess.Popen
+    '''
+    try:
+        yield process
+    except BaseException:
+        terminate_process_group(process)
+        raise
+
+@contextlib.asynccontextmanager
+async def _group_guard_async(process):
+    '''
+        Coroutine counterpart of :py:func:`_group_guard` for
+        :py:mod:`asyncio` subprocesses, which also covers cancellation.
+    '''
+    try:
+        yield process
+    except BaseException:
+        await _terminate_process_group_async(process)
+        raise
+
+def _group_alive(pgid):
+    '''
+        Whether a process group has members which are not zombies. Orphaned
+        members are reaped by init, which may take a while after they died, so
+        on Linux the states in :file:`/proc` are checked as well.
+    '''
+    if not _signal_group(pgid, 0):
+        return False
+    if not os.path.isdir('/proc/self'):
+        return True
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat', 'rb') as stat:
+                # the fields after the command name are: state ppid pgrp
+                fields = stat.read().rsplit(b')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[2]) == pgid and fields[0] != b'Z':
+            return True
+    return False
+
+def _signal_group(pgid, sig):
+    '''
+        Send a signal to a process group.
+
+        :returns: False if the group has no members left.
+    '''
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # only zombies of other owners left, nothing more can be done
+        return False
+    return True
+
+def sys_command(command, timeout=240, logging=True, log_file=None,
+                tail_size=output_tail_size, test=None, stage=None):
     '''
         Wrapper function to run shell commands with a timeout.
         Uses :py:mod:`subprocess`, :py:mod:`shlex`, :py:mod:`os`
@@ -385,10 +1015,27 @@ def sys_command(command, timeout=240, logging=True):
 
         :param timeout: The value after which the framework exits. Default set to configured to 240 seconds
 
+        :param log_file: Stream the output of the command to this file, keeping
+            only the last tail_size bytes of STDOUT and STDERR in memory.
+
+        :param tail_size: Bytes of each stream kept in memory with log_file.
+
+        :param test: Test the command is tagged with in the profile of the run.
+
+        :param stage: Stage the command is tagged with in the profile of the run.
+
         :type command: list
 
         :type timeout: int
 
+        :type log_file: str
+
+        :type tail_size: int
+
+        :type test: str
+
+        :type stage: str
+
         :returns: Error Code (int) ; STDOUT ; STDERR
 
         :rtype: list
@@ -397,61 +1044,93 @@ def sys_command(command, timeout=240, logging=True):
                                                timeout))
     out = ''
     err = ''
-    with subprocess.Popen(shlex.split(command),
-                          stdout=subprocess.PIPE,
-                          stderr=subprocess.PIPE,
-                          start_new_session=True) as process:
-        try:
-            out, err = process.communicate(timeout=timeout)
-            out = out.rstrip()
-            err = err.rstrip()
-        except subprocess.TimeoutExpired:
-            process.kill()
-            out, err = process.communicate()
-            out = out.rstrip()
-            err = err.rstrip()
-            pgrp = os.getpgid(process.pid)
-            os.killpg(pgrp, signal.SIGTERM)
-            logger.error('Process Killed')
-            logger.error("Command did not exit within {0} seconds: {1}".format(timeout,command))
-            return 1, "GuruMeditation", "TimeoutExpired"
-        rout = ''
-        rerr = ''
-        cwd = os.getcwd()
-        try:
-            fmt = sys.stdout.encoding if sys.stdout.encoding is not None else 'utf-8'
-            rout = out.decode(fmt)
-            if out:
-                if process.returncode != 0 and logging:
-                    logger.error(out.decode(fmt))
-                elif logging:
-                    logger.debug(out.decode(fmt))
-        except UnicodeError:
-            if logging:
-                logger.warning("Unable to decode STDOUT for launched subprocess. Output written to:"+
-                    cwd+"/stdout.log")
-            rout = "Unable to decode STDOUT for launched subprocess. Output written to:"+ cwd+"/stdout.log"
-            with open(cwd+"/stdout.log","wb") as f:
-                f.write(out)
-        try:
-            fmt = sys.stderr.encoding if sys.stdout.encoding is not None else 'utf-8'
-            rerr = err.decode(fmt)
-            if err:
-                if process.returncode != 0 and logging:
-                    logger.error(err.decode(fmt))
-                elif logging:
-                    logger.debug(err.decode(fmt))
-        except UnicodeError:
-            if logging:
-                logger.warning("Unable to decode STDERR for launched subprocess. Output written to:"+
-                    cwd+"/stderr.log")
-            rerr = "Unable to decode STDERR for launched subprocess. Output written to:"+ cwd+"/stderr.log"
-            with open(cwd+"/stderr.log","wb") as f:
-                f.write(out)
+    with profiling.AccountedPopen(shlex.split(command),
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  start_new_session=True) as process:
+        with _group_guard(process):
+            try:
+                if log_file is None:
+                    out, err = process.communicate(timeout=timeout)
+                else:
+                    out, err = _stream_output(process, log_file, tail_size, timeout)
+                out = out.rstrip()
+                err = err.rstrip()
+            except subprocess.TimeoutExpired:
+                latency = terminate_process_group(process)
+                process.communicate()
+                logger.error('Process Killed')
+                logger.error("Command did not exit within {0} seconds: {1}".format(timeout,command))
+                profiling.record(process, command, test, stage, latency)
+                return 1, "GuruMeditation", "TimeoutExpired"
+        profiling.record(process, command, test, stage)
+        errors = 'strict' if log_file is None else 'replace'
+        rout = _decode_output(out, 'stdout', process.returncode, logging, errors)
+        rerr = _decode_output(err, 'stderr', process.returncode, logging, errors)
     return process.returncode, rout, rerr
 
 
-def sys_command_file(command, filename, timeout=500):
+def _stream_output(process, log_file, tail_size, timeout=None):
+    '''
+        Copy the STDOUT and STDERR of a running process to a log file as they
+        are produced. Only the last tail_size bytes of each stream are kept in
+        memory, starting at a line boundary when the stream was longer.
+
+        :param process: The process, with both streams piped.
+
+        :param log_file: File the output is appended to.
+
+        :param tail_size: Bytes of each stream to keep, none if 0.
+
+        :param timeout: Seconds after which to give up on the process.
+
+        :type process: subprocess.Popen
+
+        :type log_file: str
+
+        :type tail_size: int
+
+        :type timeout: int
+
+        :raise subprocess.TimeoutExpired: If the process does not exit in time.
+
+        :returns: The tails of STDOUT and STDERR.
+
+        :rtype: tuple
+    '''
+    deadline = None if timeout is None else time.monotonic() + timeout
+    tails = {process.stdout: bytearray(), process.stderr: bytearray()}
+    with open(log_file, 'ab') as log, selectors.DefaultSelector() as selector:
+        for pipe in tails:
+            selector.register(pipe, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise subprocess.TimeoutExpired(process.args, timeout)
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, 1 << 16)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                log.write(chunk)
+                tail = tails[key.fileobj]
+                tail += chunk
+                # trimmed in bulk so the copy is amortised over many chunks,
+                # one extra byte tells that the stream was longer
+                if len(tail) > 2 * tail_size + 1:
+                    del tail[:len(tail) - tail_size - 1]
+    remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+    process.wait(timeout=remaining)
+    result = []
+    for tail in tails.values():
+        if len(tail) > tail_size:
+            tail = tail[len(tail) - tail_size:]
+            tail = tail[tail.find(b'\n') + 1:]
+        result.append(bytes(tail))
+    return tuple(result)
+
+
+def sys_command_file(command, filename, timeout=500, test=None, stage=None):
     '''
         Wrapper function to run shell commands with a timeout which involve operating with a file.
         Uses :py:mod:`subprocess`, :py:mod:`shlex`, :py:mod:`os`
@@ -464,12 +1143,20 @@ def sys_command_file(command, filename, timeout=500):
         :param timeout: The value after which the framework exits.
         Default set to configured to 240 seconds
 
+        :param test: Test the command is tagged with in the profile of the run.
+
+        :param stage: Stage the command is tagged with in the profile of the run.
+
         :type command: list
 
         :type filename: str 
 
         :type timeout: int
 
+        :type test: str
+
+        :type stage: str
+
         :returns: Error Code (int) ; None ; None 
 
         :rtype: list
@@ -480,25 +1167,190 @@ def sys_command_file(command, filename, timeout=500):
     logger.debug('$ {0} > {1}'.format(' '.join(cmd), filename))
     
     with open(filename, 'w') as fp:
-        with subprocess.Popen(cmd, stdout=fp, stderr=fp) as process:
-            timer = Timer(timeout, process.kill)
-            try:
-                timer.start()
-                stdout, stderr = process.communicate()
-            finally:
-                timer.cancel()
+        with profiling.AccountedPopen(cmd, stdout=fp, stderr=fp,
+                                      start_new_session=True) as process:
+            latency = None
+            with _group_guard(process):
+                try:
+                    process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    latency = terminate_process_group(process)
+                    logger.error("Command did not exit within {0} seconds: {1}".format(timeout,command))
+    profiling.record(process, command, test, stage, latency)
 
     return (process.returncode, None, None)
 
 
+async def async_sys_command(command, timeout=240, logging=True):
+    '''
+        Coroutine counterpart of :py:func:`sys_command`, running the command
+        with :py:mod:`asyncio` so that many commands can be in flight from a
+        single process. The command is started in its own session and its whole
+        process group is killed on timeout.
+
+        :param command: The shell command to run.
+
+        :param timeout: The value after which the command is killed. Default set to 240 seconds
+
+        :param logging: Log the output of the command.
+
+        :type command: str
+
+        :type timeout: int
+
+        :type logging: bool
+
+        :returns: Error Code (int) ; STDOUT ; STDERR
+
+        :rtype: list
+    '''
+    logger.debug('$ timeout={1} {0} '.format(' '.join(shlex.split(command)),
+                                               timeout))
+    process = await asyncio.create_subprocess_exec(*shlex.split(command),
+                                                   stdout=subprocess.PIPE,
+                                                   stderr=subprocess.PIPE,
+                                                   start_new_session=True)
+    async with _group_guard_async(process):
+        try:
+            out, err = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _terminate_process_group_async(process)
+            logger.error('Process Killed')
+            logger.error("Command did not exit within {0} seconds: {1}".format(timeout,command))
+            return 1, "GuruMeditation", "TimeoutExpired"
+    rout = _decode_output(out.rstrip(), 'stdout', process.returncode, logging)
+    rerr = _decode_output(err.rstrip(), 'stderr', process.returncode, logging)
+    return process.returncode, rout, rerr
+
+
+class asyncRunner():
+    """
+    Runs shell commands concurrently from a single process using
+    :py:func:`async_sys_command`, with at most ``max_jobs`` of them running at
+    any time. Each command returns the same (returncode, rout, rerr) triple as
+    :py:func:`sys_command`, and results are in the order of the commands.
+
+    From synchronous code::
+
+        runner = asyncRunner(max_jobs=16)
+        results = runner.run_all(['riscv64-unknown-elf-objdump -D test.elf', ...])
+
+    From a coroutine, :py:meth:`run` can be gathered with other work::
+
+        results = await asyncio.gather(*(runner.run(cmd) for cmd in commands))
+    """
+
+    def __init__(self, max_jobs=None, timeout=240, logging=True):
+        """Constructor.
+
+        :param max_jobs: Maximum number of commands running at once. Defaults
+            to the number of CPUs.
+
+        :param timeout: Default timeout for each command in seconds.
+
+        :param logging: Log the output of the commands.
+
+        :type max_jobs: int
+
+        :type timeout: int
+
+        :type logging: bool
+        """
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.logging = logging
+        self._loop = None
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        """
+        Semaphore bounding the running commands, created for the running event
+        loop since asyncio primitives may not be shared between loops.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.BoundedSemaphore(self.max_jobs)
+        return self._semaphore
+
+    async def run(self, command, timeout=None):
+        """
+        Run a command once a slot is free.
+
+        :param command: The shell command to run.
+
+        :param timeout: Timeout of the command, the runner's default if None.
+
+        :type command: str
+
+        :type timeout: int
+
+        :returns: Error Code (int) ; STDOUT ; STDERR
+
+        :rtype: list
+        """
+        async with self._get_semaphore():
+            return await async_sys_command(
+                command, self.timeout if timeout is None else timeout,
+                self.logging)
+
+    async def gather(self, commands, timeout=None):
+        """
+        Run all the commands, at most ``max_jobs`` at a time.
+
+        :param commands: The shell commands to run.
+
+        :param timeout: Timeout of each command, the runner's default if None.
+
+        :type commands: list
+
+        :type timeout: int
+
+        :returns: The result of each command, in order.
+
+        :rtype: list
+        """
+        return await asyncio.gather(*(self.run(command, timeout)
+                                      for command in commands))
+
+    def run_all(self, commands, timeout=None):
+        """
+        Blocking wrapper around :py:meth:`gather` for synchronous callers.
+
+        :param commands: The shell commands to run.
+
+        :param timeout: Timeout of each command, the runner's default if None.
+
+        :type commands: list
+
+        :type timeout: int
+
+        :returns: The result of each command, in order.
+
+        :rtype: list
+        """
+        return asyncio.run(self.gather(commands, timeout))
+
+
 class makeUtil():
     """
     Utility for ease of use of make commands like `make` and `pmake`.
     Supports automatic addition and execution of targets. Uses the class
     :py:class:`shellCommand` to execute commands.
+
+    The makefile has a phony ``all`` target, its default goal, depending on
+    every added target. Each target is appended to the makefile as it is
+    added, unless the makeUtil is buffered: targets are then kept in memory
+    and the makefile is written in one pass by :py:meth:`write`, which the
+    execute methods call when targets are pending. Buffered makeUtils must
+    be written before anything else reads their makefile.
     """
 
-    def __init__(self, makeCommand='make', makefilePath="./Makefile"):
+    #: Name of the target grouping all the added targets
+    ALL = 'all'
+
+    def __init__(self, makeCommand='make', makefilePath="./Makefile",
+                 buffered=False):
         """ Constructor.
 
         :param makeCommand: The variant of make to be used with optional arguments.
@@ -510,12 +1362,21 @@ class makeUtil():
 
         :type makefilePath: str
 
+        :param buffered: Keep the targets in memory until :py:meth:`write`
+            is called, instead of appending each of them to the makefile.
+
+        :type buffered: bool
+
         """
         self.makeCommand = makeCommand
         self.makefilePath = makefilePath
-        makefile = open(makefilePath, 'w')
-        makefile.close()
+        self.buffered = buffered
+        with open(makefilePath, 'w') as makefile:
+            if not buffered:
+                makefile.write(self._header([]))
         self.targets = []
+        self._recipes = []
+        self._pending = False
 
     def add_target(self, command, tname=""):
         """
@@ -528,13 +1389,44 @@ class makeUtil():
         :param tname: The name of the target to be used. If not specified, TARGET<num> is used as the name.
 
         :type tname: str
+
+        :raise AssertionError: If the name is the one of the grouping target.
         """
         if tname == "":
             tname = "TARGET" + str(len(self.targets))
-        with open(self.makefilePath, "a") as makefile:
-            makefile.write("\n\n.PHONY : " + tname + "\n" + tname + " :\n\t" +
-                           command.replace("\n", "\n\t"))
-            self.targets.append(tname)
+        assert tname != self.ALL, "Target name is reserved."
+        recipe = ("\n\n.PHONY : " + tname + "\n" + tname + " :\n\t" +
+                  command.replace("\n", "\n\t"))
+        self._recipes.append(recipe)
+        self.targets.append(tname)
+        if self.buffered:
+            self._pending = True
+        else:
+            # rules without recipe add to the prerequisites of all
+            with open(self.makefilePath, "a") as makefile:
+                makefile.write(recipe + "\n\n" + self.ALL + " : " + tname)
+
+    def _header(self, targets):
+        return ".PHONY : " + self.ALL + "\n" + self.ALL + " : " + " ".join(targets)
+
+    def write(self):
+        """
+        Function to write the makefile with all the targets added so far.
+        """
+        with open(self.makefilePath, "w") as makefile:
+            makefile.write(self._header(self.targets))
+            makefile.writelines(self._recipes)
+        self._pending = False
+
+    def _command(self, tname, jobs=None, load_average=None):
+        if self._pending:
+            self.write()
+        command = self.makeCommand + " -f " + self.makefilePath
+        if jobs is not None:
+            command += " -j " + str(jobs)
+        if load_average is not None:
+            command += " -l " + str(load_average)
+        return shellCommand(command + " " + tname)
 
     def execute_target(self, tname, cwd="./"):
         """
@@ -552,20 +1444,28 @@ class makeUtil():
 
         """
         assert tname in self.targets, "Target does not exist."
-        return shellCommand(self.makeCommand + " -f " + self.makefilePath +
-                            " " + tname).run(cwd=cwd)
+        return self._command(tname).run(cwd=cwd)
 
-    def execute_all(self, cwd):
+    def execute_all(self, cwd, jobs=None, load_average=None):
         """
-        Function to execute all the defined targets.
+        Function to execute all the defined targets, through the ``all``
+        target.
 
         :param cwd: The working directory to be set while executing the make command.
 
         :type cwd: str
 
+        :param jobs: Number of targets make runs at once, passed as ``-j``.
+
+        :type jobs: int
+
+        :param load_average: Load average above which make starts no new
+            target, passed as ``-l``.
+
+        :type load_average: float
+
         """
-        return shellCommand(self.makeCommand + " -f " + self.makefilePath +
-                            " " + " ".join(self.targets)).run(cwd=cwd)
+        return self._command(self.ALL, jobs, load_average).run(cwd=cwd)
 
 
 class Command():
@@ -637,6 +1537,9 @@ class Command():
     def run(self, **kwargs):
         """Execute the current command.
         Uses :py:class:`subprocess.Popen` to execute the command.
+        If `log_file` is set in `kwargs`, the output is streamed to that file
+        and only the last `tail_size` bytes of it are held in memory and logged.
+        `test` and `stage` in `kwargs` tag the command in the profile of the run.
         :return: The return code of the process     .
         :raise subprocess.CalledProcessError: If `check` is set
                 to true in `kwargs` and the process returns
@@ -644,6 +1547,10 @@ class Command():
         """
         kwargs.setdefault('shell', self._is_shell_command())
         kwargs.setdefault('timeout', 1800)
+        log_file = kwargs.pop('log_file', None)
+        tail_size = kwargs.pop('tail_size', output_tail_size)
+        test = kwargs.pop('test', None)
+        stage = kwargs.pop('stage', None)
         cwd = self._path2str(kwargs.get(
             'cwd')) if not kwargs.get('cwd') is None else self._path2str(
                 os.getcwd())
@@ -660,46 +1567,32 @@ class Command():
         # The arguments to be string.
         logger.debug(str(self))
         cmd = str(self) if kwargs['shell'] else self
-        x = subprocess.Popen(cmd,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             **process_args)
-        try:
-            out, err = x.communicate(input=in_val,timeout=timeout)
-            out = out.rstrip()
-            err = err.rstrip()
-        except subprocess.TimeoutExpired as cmd:
-            x.kill()
-            out, err = x.communicate()
-            out = out.rstrip()
-            err = err.rstrip()
-            logger.error("Process Killed.")
-            logger.error("Command did not exit within {0} seconds: {1}".format(timeout,cmd))
-
-        try:
-            fmt = sys.stdout.encoding if sys.stdout.encoding is not None else 'utf-8'
-            if out:
-                if x.returncode != 0:
-                    logger.error(out.decode(fmt))
-                else:
-                    logger.debug(out.decode(fmt))
-        except UnicodeError:
-            logger.warning("Unable to decode STDOUT for launched subprocess. Output written to:"+
-                    cwd+"/stdout.log")
-            with open(cwd+"/stdout.log","wb") as f:
-                f.write(out)
-        try:
-            fmt = sys.stderr.encoding if sys.stdout.encoding is not None else 'utf-8'
-            if err:
-                if x.returncode != 0:
-                    logger.error(err.decode(fmt))
+        process_args.setdefault('start_new_session', True)
+        x = profiling.AccountedPopen(cmd,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE,
+                                     **process_args)
+        latency = None
+        with _group_guard(x):
+            try:
+                if log_file is None or in_val is not None:
+                    out, err = x.communicate(input=in_val,timeout=timeout)
                 else:
-                    logger.debug(err.decode(fmt))
-        except UnicodeError:
-            logger.warning("Unable to decode STDERR for launched subprocess. Output written to:"+
-                    cwd+"/stderr.log")
-            with open(cwd+"/stderr.log","wb") as f:
-                f.write(out)
+                    out, err = _stream_output(x, log_file, tail_size, timeout)
+                out = out.rstrip()
+                err = err.rstrip()
+            except subprocess.TimeoutExpired as cmd:
+                latency = terminate_process_group(x)
+                out, err = x.communicate()
+                out = out.rstrip()
+                err = err.rstrip()
+                logger.error("Process Killed.")
+                logger.error("Command did not exit within {0} seconds: {1}".format(timeout,cmd))
+        profiling.record(x, str(self), test, stage, latency)
+
+        errors = 'strict' if log_file is None else 'replace'
+        _decode_output(out, 'stdout', x.returncode, errors=errors, cwd=cwd)
+        _decode_output(err, 'stderr', x.returncode, errors=errors, cwd=cwd)
         return x.returncode
 
     def _is_shell_command(self):
@@ -785,3 +1678,175 @@ class shellCommand(Command):
 
     def _is_shell_command(self):
         return True
+
+
+#: Structured result of a job run by :py:class:`jobRunner`. ``out`` and ``err``
+#: hold the (tail of the) decoded output, ``wall`` the run time in seconds and
+#: ``kill_latency`` the seconds taken to kill a timed out job, else None.
+jobResult = collections.namedtuple(
+    'jobResult',
+    ['name', 'command', 'returncode', 'out', 'err', 'wall', 'timed_out',
+     'kill_latency'])
+
+
+class jobRunner():
+    """
+    Runs :py:class:`Command` jobs on a fixed pool of long-lived worker threads,
+    each waiting on one child process at a time, so that a plugin can run the
+    commands of all its tests from a single Python process instead of through
+    pytest workers. Every job has its own timeout, on which its whole process
+    group is killed, and yields a :py:data:`jobResult`.
+
+    Typical usage::
+
+        with jobRunner(max_jobs=8) as runner:
+            for test, attr in test_dict.items():
+                runner.submit(Command('make', test), name=test, timeout=600,
+                              cwd=attr['work_dir'])
+            for result in runner.results():
+                ...
+
+    The workers are kept across calls to :py:meth:`results`, so a runner can be
+    reused for successive batches of jobs.
+    """
+
+    def __init__(self, max_jobs=None):
+        """Constructor.
+
+        :param max_jobs: Number of jobs running at once. Defaults to the number
+            of CPUs.
+
+        :type max_jobs: int
+        """
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.max_jobs,
+                                            thread_name_prefix='jobRunner')
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Wait for the submitted jobs and stop the workers."""
+        self._executor.shutdown(wait=True)
+
+    def submit(self, command, name=None, timeout=1800, cwd=None, log_file=None,
+               test=None, stage=None):
+        """
+        Queue a job.
+
+        :param command: The command to run.
+
+        :param name: Name of the job in its result, the command if None.
+
+        :param timeout: Seconds after which the job is killed.
+
+        :param cwd: Directory to run the command in.
+
+        :param log_file: Stream the output to this file, keeping only a tail
+            in memory, see :py:func:`sys_command`.
+
+        :param test: Test the command is tagged with in the profile of the run.
+
+        :param stage: Stage the command is tagged with in the profile of the run.
+
+        :type command: Command
+
+        :type name: str
+
+        :type timeout: int
+
+        :type cwd: str
+
+        :type log_file: str
+
+        :type test: str
+
+        :type stage: str
+
+        :return: Future resolving to the :py:data:`jobResult` of the job.
+
+        :rtype: concurrent.futures.Future
+        """
+        future = self._executor.submit(_run_job, command, name, timeout, cwd,
+                                       log_file, test, stage)
+        self._pending.append(future)
+        return future
+
+    def results(self):
+        """
+        Wait for all the jobs submitted since the last call.
+
+        :return: The results, in the order the jobs were submitted.
+
+        :rtype: list
+        """
+        pending, self._pending = self._pending, []
+        return [future.result() for future in pending]
+
+    def run_all(self, commands, timeout=1800, **kwargs):
+        """
+        Run a batch of commands and wait for all of them.
+
+        :param commands: The commands to run.
+
+        :param timeout: Timeout of each command, or a list with the timeout of
+            every command.
+
+        :param kwargs: Passed to :py:meth:`submit` for every command.
+
+        :type commands: list
+
+        :type timeout: int
+
+        :return: The results, in the order of the commands.
+
+        :rtype: list
+        """
+        timeouts = timeout if isinstance(timeout, (list, tuple)) else [timeout] * len(commands)
+        for command, job_timeout in zip(commands, timeouts):
+            self.submit(command, timeout=job_timeout, **kwargs)
+        return self.results()
+
+
+def _run_job(command, name, timeout, cwd, log_file, test, stage):
+    '''
+        Run a single job of a :py:class:`jobRunner` in its own session.
+
+        :returns: The result of the job.
+
+        :rtype: jobResult
+    '''
+    if not isinstance(command, Command):
+        command = Command(command)
+    shell = command._is_shell_command()
+    args = str(command) if shell else command.args
+    name = str(command) if name is None else name
+    logger.debug('$ timeout={1} {0} '.format(command, timeout))
+    latency = None
+    with profiling.AccountedPopen(args,
+                                  shell=shell,
+                                  cwd=cwd,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  start_new_session=True) as process:
+        with _group_guard(process):
+            try:
+                if log_file is None:
+                    out, err = process.communicate(timeout=timeout)
+                else:
+                    out, err = _stream_output(process, log_file, output_tail_size,
+                                              timeout)
+            except subprocess.TimeoutExpired:
+                latency = terminate_process_group(process)
+                out, err = process.communicate()
+                logger.error("Job {0} did not exit within {1} seconds".format(name, timeout))
+    profiling.record(process, str(command), test, stage, latency)
+    return jobResult(name, str(command), process.returncode,
+                     out.rstrip().decode(errors='replace'),
+                     err.rstrip().decode(errors='replace'),
+                     time.monotonic() - process.start_time, latency is not None,
+                     latency)
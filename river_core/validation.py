@@ -0,0 +1,337 @@
+# See LICENSE for details
+"""Provide parallel, memoised validation of generated test lists"""
+import os
+import copy
+import json
+import time
+import hashlib
+import functools
+import collections.abc
+from multiprocessing import Pool
+from ruamel.yaml import YAML
+from river_core.constants import YamlValidator, testlist_schema
+
+#: Number of tests validated by a worker at a time. Lists of at most one chunk
+#: are validated in the calling process.
+CHUNK_SIZE = 500
+
+_validator = None
+
+#: Python types of the cerberus types used by the schemas, and the types
+#: excluded from them
+_types = {
+    'string': ((str,), ()),
+    'integer': ((int,), ()),
+    'boolean': ((bool,), ()),
+    'list': ((collections.abc.Sequence,), (str,))
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _isfile(path):
+    return os.path.isfile(path)
+
+
+@functools.lru_cache(maxsize=None)
+def _isdir(path):
+    return os.path.isdir(path)
+
+
+class CachedYamlValidator(YamlValidator):
+    """
+    :py:class:`river_core.constants.YamlValidator` checking each path on the
+    filesystem only once per process, as most tests of a list share their
+    linker file, extra sources and include directories. It is the reference
+    the compiled validators are benchmarked against.
+    """
+
+    def _check_with_filecheck(self, field, value):
+        if not _isfile(value):
+            self._error(field, 'File {0} not found'.format(value))
+
+    def _check_with_dircheck(self, field, value):
+        if not _isdir(value):
+            self._error(field, 'Dir {0} not found'.format(value))
+
+
+#: Functions and error messages of the check_with rules
+checks = {
+    'filecheck': (_isfile, 'File {0} not found'),
+    'dircheck': (_isdir, 'Dir {0} not found')
+}
+
+
+def _compile_rules(rules):
+    """
+    Compile the rules of a field into a function returning the errors of a
+    value, or None if it is valid.
+    """
+    unsupported = set(rules) - {
+        'type', 'nullable', 'required', 'default', 'empty', 'check_with',
+        'schema'
+    }
+    if unsupported:
+        raise ValueError(f'Unsupported schema rules {sorted(unsupported)}')
+    nullable = rules.get('nullable', False)
+    types, excluded = _types[rules['type']] if 'type' in rules else ((object,), ())
+    type_error = f"must be of {rules.get('type')} type"
+    empty = rules.get('empty', True)
+    check = None
+    if 'check_with' in rules:
+        if rules['check_with'] not in checks:
+            raise ValueError(f"Unknown check_with rule {rules['check_with']}")
+        check = checks[rules['check_with']]
+    item_rules = _compile_rules(rules['schema']) if 'schema' in rules else None
+
+    def validate(value):
+        if value is None:
+            return None if nullable else ['null value not allowed']
+        if not isinstance(value, types) or isinstance(value, excluded):
+            return [type_error]
+        if not empty and isinstance(value, collections.abc.Sized) and not len(value):
+            return ['empty values not allowed']
+        if check is not None and not check[0](value):
+            return [check[1].format(value)]
+        if item_rules is not None:
+            errors = {}
+            for index, item in enumerate(value):
+                error = item_rules(item)
+                if error:
+                    errors[index] = error
+            if errors:
+                return [errors]
+        return None
+
+    return validate
+
+
+def compile_schema(schema):
+    """
+    Compile a cerberus schema, as used by :py:class:`CachedYamlValidator` with
+    unknown fields disallowed, into a function validating and normalising a
+    document in a single pass. Only the rules used by the test list schema are
+    supported: type, nullable, required, default, empty, check_with and schema.
+
+    :param schema: The schema.
+
+    :type schema: dict
+
+    :raise ValueError: If the schema uses an unsupported rule.
+
+    :return: Function taking a document and returning the normalised document
+        along with the errors in the format of cerberus, empty if it is valid.
+
+    :rtype: function
+    """
+    fields = [(field, _compile_rules(rules)) for field, rules in schema.items()]
+    defaults = [(field, rules['default'], rules.get('nullable', False))
+                for field, rules in schema.items()
+                if 'default' in rules]
+    required = [
+        field for field, rules in schema.items() if rules.get('required', False)
+    ]
+    known = frozenset(schema)
+
+    def validate(document):
+        document = dict(document)
+        for field, default, nullable in defaults:
+            if document.get(field) is None and (field not in document or
+                                                not nullable):
+                document[field] = copy.copy(default)
+        errors = {}
+        for field in document:
+            if field not in known:
+                errors[field] = ['unknown field']
+        for field in required:
+            if field not in document:
+                errors[field] = ['required field']
+        for field, rules in fields:
+            if field in document:
+                error = rules(document[field])
+                if error:
+                    errors[field] = error
+        return document, errors
+
+    return validate
+
+
+def testlist_validator():
+    """
+    Validator of test list entries compiled from
+    :py:data:`river_core.constants.testlist_schema`, once per process.
+
+    :rtype: function
+    """
+    global _validator
+    if _validator is None:
+        _validator = compile_schema(YAML(typ="safe").load(testlist_schema))
+    return _validator
+
+
+def entry_hash(fields):
+    """
+    Hash of a test list entry.
+
+    :param fields: The entry, as returned by a generator.
+
+    :type fields: dict
+
+    :return: Hex digest, or None if the entry is not JSON serialisable.
+
+    :rtype: str
+    """
+    try:
+        data = json.dumps(fields, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def validate_chunk(items):
+    """
+    Validate and normalise test list entries.
+
+    :param items: (test, fields) pairs.
+
+    :type items: list
+
+    :return: (test, normalised fields, errors) triples. Invalid entries have
+        None as normalised fields.
+
+    :rtype: list
+    """
+    validate = testlist_validator()
+    results = []
+    for test, fields in items:
+        normalised, errors = validate(fields)
+        results.append((test, None if errors else normalised, errors))
+    return results
+
+
+def validate_test_list(test_list, process_count=None, cache_file=None,
+                       skip_unchanged=False):
+    """
+    Validate and normalise all the entries of a test list, in chunks spread
+    over a pool of workers. The hashes of the valid entries are recorded in a
+    cache file along with their normalised form, so that the entries of a later
+    list which are unchanged can be taken from it instead of being validated
+    again.
+
+    :param test_list: The test list, updated in place with the normalised
+        entries.
+
+    :param process_count: Number of worker processes. Defaults to the number of
+        CPUs.
+
+    :param cache_file: JSON file recording the validated entries.
+
+    :param skip_unchanged: Take the entries unchanged since the cache file was
+        written from it. Their files are not checked again.
+
+    :type test_list: dict
+
+    :type process_count: int
+
+    :type cache_file: str
+
+    :type skip_unchanged: bool
+
+    :return: Errors of every invalid test, by test name.
+
+    :rtype: dict
+    """
+    cached = {}
+    if skip_unchanged and cache_file is not None and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'r') as fd:
+                cached = json.load(fd)
+        except (OSError, ValueError):
+            cached = {}
+    hashes = {}
+    pending = []
+    for test, fields in test_list.items():
+        hashes[test] = entry_hash(fields)
+        record = cached.get(test)
+        if record is not None and hashes[test] is not None and record[0] == hashes[test]:
+            test_list[test] = record[1]
+        else:
+            pending.append((test, fields))
+
+    chunks = [
+        pending[i:i + CHUNK_SIZE] for i in range(0, len(pending), CHUNK_SIZE)
+    ]
+    if len(chunks) > 1:
+        with Pool(processes=process_count) as process_pool:
+            results = process_pool.imap_unordered(validate_chunk, chunks)
+            results = [x for chunk in results for x in chunk]
+    else:
+        results = validate_chunk(pending)
+
+    errors = {}
+    for test, normalised, error in results:
+        if normalised is None:
+            errors[test] = error
+        else:
+            test_list[test] = normalised
+
+    if cache_file is not None:
+        records = {
+            test: [hashes[test], test_list[test]]
+            for test in test_list
+            if test not in errors and hashes[test] is not None
+        }
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        # the cache only saves time, a failed write leaves the old one
+        try:
+            with open(tmp_file, 'w') as fd:
+                json.dump(records, fd)
+            os.replace(tmp_file, cache_file)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+    return errors
+
+
+def benchmark(test_list):
+    """
+    Time the validation of a test list by the compiled validator against the
+    cerberus one, both in the calling process, and check that they agree.
+    Entries cerberus raises on, e.g. null paths, are left out of the check.
+
+    :param test_list: The test list, left unchanged.
+
+    :type test_list: dict
+
+    :raise AssertionError: If the two validators disagree on an entry.
+
+    :return: Seconds taken by each validator, keyed ``cerberus`` and
+        ``compiled``.
+
+    :rtype: dict
+    """
+    schema = YAML(typ="safe").load(testlist_schema)
+    validator = CachedYamlValidator(schema)
+    validator.allow_unknown = False
+    start = time.perf_counter()
+    expected = {}
+    for test, fields in test_list.items():
+        try:
+            if validator.validate(fields):
+                expected[test] = (validator.normalized(fields, schema), {})
+            else:
+                expected[test] = (None, validator.errors)
+        except TypeError:
+            continue
+    timings = {'cerberus': time.perf_counter() - start}
+    validate = compile_schema(schema)
+    start = time.perf_counter()
+    results = {}
+    for test, fields in test_list.items():
+        normalised, errors = validate(fields)
+        results[test] = (None if errors else normalised, errors)
+    timings['compiled'] = time.perf_counter() - start
+    for test in expected:
+        assert results[test] == expected[test], f'{test}: {results[test]} != {expected[test]}'
+    return timings
@@ -24,14 +24,13 @@ test_requirements = []
 setup(
     author="InCore Semiconductors Pvt. Ltd.; Tessolve",
     author_email='neelgala@incoresemi.com',
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
@@ -62,6 +61,6 @@ setup(
     tests_require=test_requirements,
     url=
     'https://github.com/incoresemi/river_core',
-    version='1.9.6',
+    version='1.10.0',
     zip_safe=False,
 )